@@ -19,6 +19,46 @@ class Settings:
     # Note: user provided Latitude: 18.46 and Longitude: 73.88 (assumed East, positive)
     COLLEGE_LAT: float = float(os.getenv("COLLEGE_LAT", "18.46"))
     COLLEGE_LNG: float = float(os.getenv("COLLEGE_LNG", "73.88"))
+    # Default shortest-path algorithm: dijkstra, astar or bidirectional (requests may override it)
+    ROUTING_ALGORITHM: str = os.getenv("ROUTING_ALGORITHM", "dijkstra")
+    # Answer shortest-path queries from a contraction hierarchy (built once, saved next to the graph)
+    ROUTING_CONTRACTION_HIERARCHY: bool = os.getenv("ROUTING_CONTRACTION_HIERARCHY", "false").lower() in ("1", "true", "yes")
+    # Extra fixed destinations with precomputed shortest-path trees (the college always has one)
+    # Example: 18.52,73.85;18.50,73.90
+    ROUTING_DESTINATIONS: str = os.getenv("ROUTING_DESTINATIONS", "")
+
+    # OSRM server for /routing/shortest-path-osrm (point at a local OSRM in tests or self-hosting)
+    OSRM_BASE_URL: str = os.getenv("OSRM_BASE_URL", "https://router.project-osrm.org")
+    OSRM_TIMEOUT_SECONDS: float = float(os.getenv("OSRM_TIMEOUT_SECONDS", "10"))
+    OSRM_MAX_CONNECTIONS: int = int(os.getenv("OSRM_MAX_CONNECTIONS", "20"))
+    # Routes cached per snapped origin/destination pair
+    OSRM_CACHE_SIZE: int = int(os.getenv("OSRM_CACHE_SIZE", "1024"))
+    OSRM_CACHE_TTL_SECONDS: float = float(os.getenv("OSRM_CACHE_TTL_SECONDS", "3600"))
+
+    # Answer /rides/nearby from an in-memory index of active rides, kept in sync from a
+    # change stream (replica sets) or by polling every LIVE_RIDE_INDEX_POLL_SECONDS
+    LIVE_RIDE_INDEX: bool = os.getenv("LIVE_RIDE_INDEX", "false").lower() in ("1", "true", "yes")
+    LIVE_RIDE_INDEX_POLL_SECONDS: float = float(os.getenv("LIVE_RIDE_INDEX_POLL_SECONDS", "2"))
+
+    # bcrypt cost factor for new password hashes; hashes with another cost are rehashed on login
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    # Threads hashing and verifying passwords off the event loop (bounds concurrent bcrypt work)
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+    # Verified JWT payloads kept so repeat requests skip signature checks (entries expire with the token)
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+    # Comma separated user ids allowed to call operator endpoints (e.g. live edge weights); empty means nobody
+    OPERATOR_USER_IDS: str = os.getenv("OPERATOR_USER_IDS", "")
+
+    @property
+    def operator_user_ids(self) -> set[str]:
+        return {u.strip() for u in self.OPERATOR_USER_IDS.split(',') if u.strip()}
+
+    @property
+    def routing_destinations(self) -> list[tuple[float, float]]:
+        pairs = [p.split(',') for p in self.ROUTING_DESTINATIONS.split(';') if p.strip()]
+        return [(float(lat), float(lng)) for lat, lng in pairs]
 
 @lru_cache()
 def get_settings():
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, status, Depends, Header
 from pydantic import BaseModel
 from app.models.user_model import UserRegistration
 from app.services.user_service import UserService
-from app.utils.auth import verify_password, create_access_token, get_current_user_id
+from app.utils.auth import verify_and_update_password, create_access_token, get_current_user_id, get_current_user, token_cache
 from datetime import timedelta
 from typing import Optional
 
@@ -59,12 +59,20 @@ async def login_user(login_data: LoginRequest):
                 detail="Incorrect email or password"
             )
         
-        # Verify password
-        if not verify_password(login_data.password, user["password_hash"]):
+        # Verify password (off the event loop)
+        valid, new_hash = await verify_and_update_password(login_data.password, user["password_hash"])
+        if not valid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password"
             )
+        if new_hash:
+            # Stored with an old cost factor: upgrade it while we have the plain password.
+            # The old hash still works, so a failed upgrade must not fail the login
+            try:
+                await user_service.update_password_hash(user["_id"], new_hash)
+            except Exception as e:
+                print(f"Password rehash failed for user {user['_id']}: {e}")
         
         # Create access token
         access_token_expires = timedelta(minutes=30)
@@ -136,4 +144,9 @@ async def get_user_profile(authorization: Optional[str] = Header(None)):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get profile: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/token-cache")
+async def get_token_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Size and hit/miss counters of the verified-token cache"""
+    return token_cache.stats()
@@ -1,20 +1,139 @@
-from fastapi import APIRouter, HTTPException, Response
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 import networkx as nx
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+matplotlib.rcParams['svg.fonttype'] = 'none'  # Keep SVG labels as text rather than glyph outlines
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+import asyncio
 import io
-from typing import Dict, List, Tuple
+from typing import Dict, List, Literal, Optional, Tuple
 import json
+from app.utils.http_cache import CachedBody, PayloadCache, cached_response
 
 router = APIRouter(prefix="/rider", tags=["Network"])
 
+FIGURE_SIZE = (16, 12)  # inches
+FULL_DPI = 300
+PAD_INCHES = 0.1
+
+def render_network_image(G: nx.Graph, node_positions: Dict[str, Tuple[float, float]],
+                         image_format: str = 'png', width: Optional[int] = None) -> bytes:
+    """
+    Draw the network as an SVG, or a PNG rasterised at FULL_DPI or at
+    whatever dpi makes the trimmed image width pixels wide.
+
+    Uses a standalone Figure rather than pyplot, so no global figure state
+    is touched (or leaked) and it is safe to call from a worker thread.
+    """
+    # Set up the plot with a clean background
+    fig = Figure(figsize=FIGURE_SIZE)
+    ax = fig.subplots()
+    ax.set_facecolor('#f8f9fa')  # Light gray background
+    
+    # Define colors for different types of nodes
+    node_colors = []
+    node_sizes = []
+    
+    for node in G.nodes():
+        if node == "VIIT College":
+            node_colors.append('#dc3545')  # Red for VIIT College
+            node_sizes.append(1200)  # Larger size for destination
+        elif node in ["Pune Station", "Swargate", "Shivajinagar"]:
+            node_colors.append('#007bff')  # Blue for major hubs
+            node_sizes.append(800)
+        else:
+            node_colors.append('#28a745')  # Green for regular areas
+            node_sizes.append(600)
+    
+    # Draw the network
+    nx.draw_networkx_nodes(
+        G, 
+        pos=node_positions,
+        node_color=node_colors,
+        node_size=node_sizes,
+        alpha=0.8,
+        edgecolors='white',
+        linewidths=2,
+        ax=ax
+    )
+    
+    # Draw edges with a clean style
+    nx.draw_networkx_edges(
+        G,
+        pos=node_positions,
+        edge_color='#6c757d',
+        width=2,
+        alpha=0.6,
+        style='-',
+        ax=ax
+    )
+    
+    # Draw labels with better formatting
+    labels = {node: node.replace(" ", "\n") for node in G.nodes()}
+    nx.draw_networkx_labels(
+        G,
+        pos=node_positions,
+        labels=labels,
+        font_size=9,
+        font_weight='bold',
+        font_color='#212529',
+        bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.8, edgecolor='none'),
+        ax=ax
+    )
+    
+    # Add title and styling
+    ax.set_title("Pune Area Network Map\nRide Sharing Routes", 
+                 fontsize=20, fontweight='bold', pad=20, color='#212529')
+    
+    # Add legend
+    legend_elements = [
+        Line2D([0], [0], marker='o', color='w', markerfacecolor='#dc3545', 
+               markersize=15, label='VIIT College (Destination)', markeredgecolor='white', markeredgewidth=2),
+        Line2D([0], [0], marker='o', color='w', markerfacecolor='#007bff', 
+               markersize=12, label='Major Hubs', markeredgecolor='white', markeredgewidth=2),
+        Line2D([0], [0], marker='o', color='w', markerfacecolor='#28a745', 
+               markersize=10, label='Residential Areas', markeredgecolor='white', markeredgewidth=2),
+    ]
+    
+    ax.legend(handles=legend_elements, loc='upper left', fontsize=12, 
+              frameon=True, fancybox=True, shadow=True)
+    
+    # Remove axes and set equal aspect ratio
+    ax.set_aspect('equal')
+    ax.axis('off')
+    
+    # Adjust layout
+    fig.tight_layout()
+    
+    # Size the raster from the trimmed ('tight') extent the image will actually have
+    dpi = FULL_DPI
+    if width is not None:
+        dpi = width / (fig.get_tightbbox().width + 2 * PAD_INCHES)
+    
+    # Save to bytes
+    img_buffer = io.BytesIO()
+    fig.savefig(img_buffer, format=image_format, dpi=dpi, bbox_inches='tight', pad_inches=PAD_INCHES,
+                facecolor='white', edgecolor='none')
+    return img_buffer.getvalue()
+
 class PuneNetworkGraph:
     def __init__(self):
         self.G = nx.Graph()
         self.node_positions = {}
+        # Bumped on every change so cached renderings know they are stale
+        self.version = 0
         self._create_pune_network()
+
+    def add_area(self, area: str, position: Tuple[float, float]) -> None:
+        self.G.add_node(area)
+        self.node_positions[area] = position
+        self.version += 1
+
+    def add_connection(self, a: str, b: str) -> None:
+        self.G.add_edge(a, b)
+        self.version += 1
     
     def _create_pune_network(self):
         """Create a NetworkX graph representing Pune's area network based on real map layout"""
@@ -130,95 +249,7 @@ class PuneNetworkGraph:
     
     def generate_graph_image(self) -> bytes:
         """Generate a clean and fresh visualization of the Pune network graph"""
-        
-        # Create figure with larger size for better visibility
-        plt.figure(figsize=(16, 12))
-        plt.clf()
-        
-        # Set up the plot with a clean background
-        fig, ax = plt.subplots(figsize=(16, 12))
-        ax.set_facecolor('#f8f9fa')  # Light gray background
-        
-        # Define colors for different types of nodes
-        node_colors = []
-        node_sizes = []
-        
-        for node in self.G.nodes():
-            if node == "VIIT College":
-                node_colors.append('#dc3545')  # Red for VIIT College
-                node_sizes.append(1200)  # Larger size for destination
-            elif node in ["Pune Station", "Swargate", "Shivajinagar"]:
-                node_colors.append('#007bff')  # Blue for major hubs
-                node_sizes.append(800)
-            else:
-                node_colors.append('#28a745')  # Green for regular areas
-                node_sizes.append(600)
-        
-        # Draw the network
-        nx.draw_networkx_nodes(
-            self.G, 
-            pos=self.node_positions,
-            node_color=node_colors,
-            node_size=node_sizes,
-            alpha=0.8,
-            edgecolors='white',
-            linewidths=2
-        )
-        
-        # Draw edges with a clean style
-        nx.draw_networkx_edges(
-            self.G,
-            pos=self.node_positions,
-            edge_color='#6c757d',
-            width=2,
-            alpha=0.6,
-            style='-'
-        )
-        
-        # Draw labels with better formatting
-        labels = {node: node.replace(" ", "\n") for node in self.G.nodes()}
-        nx.draw_networkx_labels(
-            self.G,
-            pos=self.node_positions,
-            labels=labels,
-            font_size=9,
-            font_weight='bold',
-            font_color='#212529',
-            bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.8, edgecolor='none')
-        )
-        
-        # Add title and styling
-        plt.title("Pune Area Network Map\nRide Sharing Routes", 
-                 fontsize=20, fontweight='bold', pad=20, color='#212529')
-        
-        # Add legend
-        legend_elements = [
-            plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#dc3545', 
-                      markersize=15, label='VIIT College (Destination)', markeredgecolor='white', markeredgewidth=2),
-            plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#007bff', 
-                      markersize=12, label='Major Hubs', markeredgecolor='white', markeredgewidth=2),
-            plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#28a745', 
-                      markersize=10, label='Residential Areas', markeredgecolor='white', markeredgewidth=2),
-        ]
-        
-        plt.legend(handles=legend_elements, loc='upper left', fontsize=12, 
-                  frameon=True, fancybox=True, shadow=True)
-        
-        # Remove axes and set equal aspect ratio
-        ax.set_aspect('equal')
-        ax.axis('off')
-        
-        # Adjust layout
-        plt.tight_layout()
-        
-        # Save to bytes
-        img_buffer = io.BytesIO()
-        plt.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight', 
-                   facecolor='white', edgecolor='none')
-        img_buffer.seek(0)
-        plt.close()
-        
-        return img_buffer.getvalue()
+        return render_network_image(self.G, self.node_positions)
     
     def get_graph_data(self) -> Dict:
         """Get graph data as JSON for frontend processing"""
@@ -259,27 +290,81 @@ class PuneNetworkGraph:
             "total_edges": len(edges)
         }
 
+# PNG widths served for the network image; requested widths round up to the next one
+# and None is the full FULL_DPI rendering
+NETWORK_IMAGE_WIDTHS = (320, 640, 1280, 2560)
+NETWORK_IMAGE_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+ImageVariant = Tuple[str, Optional[int]]  # (format, pixel width; None for SVG and full-size PNG)
+
+def network_image_variant(image_format: str = "png", width: Optional[int] = None) -> ImageVariant:
+    """Snap a requested format/width to one of the cached variants"""
+    if image_format == "svg" or width is None:
+        return image_format, None
+    return image_format, next((w for w in NETWORK_IMAGE_WIDTHS if w >= width), None)
+
+class NetworkImageCache:
+    """
+    Rendered network images, one per variant, kept until the graph changes.
+    Each variant is rendered on first use in a worker thread; smaller PNGs
+    are rasterised directly at a lower dpi, never scaled down from the full one.
+    Variants have their own locks, so a thumbnail never waits for a
+    full-size render.
+    """
+
+    def __init__(self, network: PuneNetworkGraph):
+        self.network = network
+        self.variants: Dict[ImageVariant, Tuple[int, CachedBody]] = {}
+        self._locks: Dict[ImageVariant, asyncio.Lock] = {}
+
+    async def get(self, variant: ImageVariant = ("png", None)) -> CachedBody:
+        variant = network_image_variant(*variant)
+        entry = self.variants.get(variant)
+        if entry is not None and entry[0] == self.network.version:
+            return entry[1]
+        async with self._locks.setdefault(variant, asyncio.Lock()):
+            # Another request may have rendered it while we waited
+            entry = self.variants.get(variant)
+            if entry is None or entry[0] != self.network.version:
+                version = self.network.version
+                image_format, width = variant
+                # Render a snapshot so later graph changes cannot race the worker thread
+                G, positions = self.network.G.copy(), dict(self.network.node_positions)
+                image_bytes = await run_in_threadpool(render_network_image, G, positions, image_format, width)
+                payload = CachedBody.build(image_bytes, NETWORK_IMAGE_TYPES[image_format],
+                                           {"Content-Disposition": f"inline; filename=pune_network.{image_format}"})
+                entry = self.variants[variant] = (version, payload)
+            return entry[1]
+
 # Global instance
 pune_network = PuneNetworkGraph()
+network_image = NetworkImageCache(pune_network)
+
+network_payloads = PayloadCache()
+
+# Browsers may reuse the image and data this long before revalidating with If-None-Match
+NETWORK_IMAGE_MAX_AGE = 300
 
 @router.get("/network")
-async def get_pune_network_graph():
+async def get_pune_network_graph(
+    request: Request,
+    format: Literal["png", "svg"] = Query("png", description="png, or svg for a small resolution-independent image"),
+    width: Optional[int] = Query(None, ge=1, description="PNG width in pixels, rounded up to a cached size; full resolution when omitted"),
+):
     """Get Pune area network graph as image"""
     try:
-        image_bytes = pune_network.generate_graph_image()
-        return StreamingResponse(
-            io.BytesIO(image_bytes),
-            media_type="image/png",
-            headers={"Content-Disposition": "inline; filename=pune_network.png"}
-        )
+        payload = await network_image.get((format, width))
+        return cached_response(request, payload, NETWORK_IMAGE_MAX_AGE)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating graph: {str(e)}")
 
 @router.get("/network/data")
-async def get_pune_network_data():
+async def get_pune_network_data(request: Request):
     """Get Pune area network graph data as JSON"""
     try:
-        return pune_network.get_graph_data()
+        payload = network_payloads.get("data", pune_network.version,
+                                       lambda: CachedBody.json(pune_network.get_graph_data()))
+        return cached_response(request, payload, NETWORK_IMAGE_MAX_AGE)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting graph data: {str(e)}")
 
@@ -287,11 +372,10 @@ async def get_pune_network_data():
 async def get_network_info():
     """Get basic information about the Pune network"""
     try:
-        graph_data = pune_network.get_graph_data()
         return {
             "message": "Pune Area Network Map for Ride Sharing",
-            "total_areas": graph_data["total_nodes"],
-            "total_connections": graph_data["total_edges"],
+            "total_areas": pune_network.G.number_of_nodes(),
+            "total_connections": pune_network.G.number_of_edges(),
             "destination": "VIIT College",
             "coverage": "25+ major areas in Pune",
             "features": [
@@ -1,6 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
+from datetime import datetime
+import json
 from ..services.ride_service import RideService
+from ..services.live_ride_index import LiveRideIndex
+from ..services.fare_quote_service import FareQuoteEngine
+from .routing_controller import routing_service
 from ..models.ride_model import RideStatus
 from ..dtos.ride_dto import (
     CreateRideRequest,
@@ -8,18 +15,41 @@ from ..dtos.ride_dto import (
     RideResponse,
     NearbyRidesRequest,
     NearbyRidesResponse,
-    UserRidesResponse
+    UserRidesResponse,
+    BulkStatusUpdateRequest,
+    BulkStatusUpdateResponse,
+    RecurringRideRequest,
+    RecurringRidesResponse,
+    FareQuoteRequest,
+    FareQuote,
+    FareQuoteResponse
 )
 from ..utils.auth import get_current_user
 from ..utils.rate_limiter import limiter
 from motor.motor_asyncio import AsyncIOMotorCollection
-from ..config import get_db
+from ..config import get_db, get_settings
 
 router = APIRouter(prefix="/rides", tags=["Rides"])
 
+# NDJSON lines per write when streaming a user's rides
+RIDE_STREAM_CHUNK = 256
+
+settings = get_settings()
+# Started on application startup when enabled
+live_ride_index = LiveRideIndex(settings.LIVE_RIDE_INDEX_POLL_SECONDS) if settings.LIVE_RIDE_INDEX else None
+# Prices rides on road distances from the routing graph
+fare_engine = FareQuoteEngine(routing_service)
+
 async def get_ride_service() -> RideService:
     db = await get_db()
-    return RideService(db.rides)
+    return RideService(db.rides, live_ride_index, fare_engine)
+
+@router.get("/live-index/metrics")
+async def live_index_metrics(current_user: dict = Depends(get_current_user)):
+    """Size and sync state of the in-memory nearby-ride index"""
+    if live_ride_index is None:
+        raise HTTPException(status_code=404, detail="Live ride index is disabled")
+    return live_ride_index.metrics()
 
 @router.post("/nearby", response_model=NearbyRidesResponse)
 @limiter.limit("30/minute")
@@ -31,10 +61,11 @@ async def get_nearby_rides(
 ):
     """Get nearby ride requests for riders."""
     try:
-        rides = await ride_service.find_nearby_rides(nearby_request)
+        rides, has_more = await ride_service.find_nearby_rides(nearby_request)
         return NearbyRidesResponse(
-            rides=[RideResponse(**ride.dict()) for ride in rides],
-            total_count=len(rides)
+            rides=[RideResponse(**ride.dict(), distance_km=ride.distance_km) for ride in rides],
+            total_count=len(rides),
+            next_skip=nearby_request.skip + len(rides) if has_more else None
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -54,6 +85,72 @@ async def create_ride_request(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/quote", response_model=FareQuoteResponse)
+@limiter.limit("30/minute")
+async def quote_fares(
+    request: Request,
+    quote_request: FareQuoteRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Estimate fares for many trips at once, priced on road distances."""
+    try:
+        rides = quote_request.rides
+        # Routing uncached pairs can take a while for big batches: keep it off the event loop
+        fares, km, reachable = await run_in_threadpool(
+            fare_engine.quote,
+            [(r.pickup.latitude, r.pickup.longitude) for r in rides],
+            [(r.dropoff.latitude, r.dropoff.longitude) for r in rides],
+            [r.number_of_passengers for r in rides]
+        )
+        quotes = [FareQuote(distance_km=d, estimated_fare=f, road_distance=r)
+                  for d, f, r in zip(km.tolist(), fares.tolist(), reachable.tolist())]
+        return FareQuoteResponse(quotes=quotes, total_count=len(quotes))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/recurring", response_model=RecurringRidesResponse)
+@limiter.limit("5/minute")
+async def create_recurring_rides(
+    request: Request,
+    schedule_request: RecurringRideRequest,
+    ride_service: RideService = Depends(get_ride_service),
+    current_user: dict = Depends(get_current_user)
+):
+    """Book the same ride on chosen weekdays between two dates (e.g. 08:30 every weekday this semester)."""
+    try:
+        schedule_id, rides = await ride_service.create_recurring_rides(schedule_request, current_user["id"])
+        return RecurringRidesResponse(
+            schedule_id=schedule_id,
+            rides=[RideResponse(**ride.dict()) for ride in rides],
+            total_count=len(rides)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/status", response_model=BulkStatusUpdateResponse)
+@limiter.limit("20/minute")
+async def update_ride_statuses(
+    request: Request,
+    bulk_request: BulkStatusUpdateRequest,
+    ride_service: RideService = Depends(get_ride_service),
+    current_user: dict = Depends(get_current_user)
+):
+    """Move several of the current user's rides through their status transitions at once."""
+    try:
+        updates = [(u.ride_id, u.status) for u in bulk_request.updates]
+        not_updated = await ride_service.update_statuses(updates, current_user["id"])
+        return BulkStatusUpdateResponse(
+            requested=len(updates),
+            updated=len(updates) - len(not_updated),
+            not_updated=not_updated
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.patch("/{ride_id}", response_model=RideResponse)
 @limiter.limit("20/minute")
 async def update_ride_request(
@@ -65,31 +162,64 @@ async def update_ride_request(
 ):
     """Update a ride request."""
     try:
-        ride = await ride_service.update_ride(ride_id, update_request)
+        ride = await ride_service.update_ride(ride_id, current_user["id"], update_request)
         return RideResponse(**ride.dict())
-    except ValueError as e:
+    except LookupError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
 @router.get("/user", response_model=UserRidesResponse)
 @limiter.limit("30/minute")
 async def get_user_rides(
     request: Request,
-    status: Optional[List[RideStatus]] = None,
+    status: Optional[List[RideStatus]] = Query(None),
+    limit: int = Query(100, ge=1, le=100),
+    cursor: Optional[str] = None,
+    stream: bool = False,
     ride_service: RideService = Depends(get_ride_service),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all rides for the current user with optional status filtering."""
+    """
+    Get the current user's rides, newest first, with optional status filtering.
+
+    Pages of `limit` rides are chained with `next_cursor`. With stream=true every
+    ride (after `cursor`, if given) is streamed as NDJSON, one ride per line.
+    """
     try:
-        rides = await ride_service.get_user_rides(current_user["id"], status)
-        return UserRidesResponse(
-            rides=[RideResponse(**ride.dict()) for ride in rides],
-            total_count=len(rides)
-        )
+        if stream:
+            docs = ride_service.iter_user_rides(current_user["id"], status, cursor)
+        else:
+            rides, next_cursor = await ride_service.get_user_rides(current_user["id"], status, limit, cursor)
+            return UserRidesResponse(
+                rides=[RideResponse(**ride.dict()) for ride in rides],
+                total_count=len(rides),
+                next_cursor=next_cursor
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def lines():
+        chunk = []
+        async for doc in docs:
+            chunk.append(json.dumps(doc, default=_json_default))
+            if len(chunk) == RIDE_STREAM_CHUNK:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @router.post("/{ride_id}/cancel", response_model=RideResponse)
 @limiter.limit("10/minute")
 async def cancel_ride(
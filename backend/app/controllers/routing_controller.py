@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from datetime import time
 from app.services.routing_service import RoutingService
+from app.services.osrm_service import OSRMService
 from app.services.corridor_matching_service import simulate_corridor_matching, GeometricCorridorMatcher, Point, Hostelite
 from app.config import get_settings
+from app.utils.auth import get_current_operator
+from app.utils.http_cache import CachedBody, PayloadCache, cached_response
 import os
-import httpx
+import json
 
 router = APIRouter(prefix="/routing", tags=["Routing"])
 
@@ -14,6 +21,11 @@ class Location(BaseModel):
 
 class ShortestPathRequest(BaseModel):
     start_location: Location
+    # Overrides the server default (the college's precomputed tree, then "ch" when a
+    # hierarchy is prepared, then ROUTING_ALGORITHM)
+    algorithm: Optional[Literal["dijkstra", "astar", "bidirectional", "ch"]] = None
+    # Local departure time: route by time-of-day travel times instead of distance
+    departure_time: Optional[time] = None
 
 class ShortestPathResponse(BaseModel):
     start_node: str
@@ -21,11 +33,52 @@ class ShortestPathResponse(BaseModel):
     distance_km: float
     nodes: list[str]
     path: list[list[float]]  # [[lat,lng], ...]
+    algorithm: Optional[str] = None
+    settled_nodes: Optional[int] = None  # nodes the search settled, for comparing algorithms (0 for "tree")
+    duration_minutes: Optional[float] = None  # travel time, for departure_time requests
+
+class BatchShortestPathRequest(BaseModel):
+    start_locations: list[Location] = Field(..., min_length=1, max_length=20000)
+
+class MatrixRequest(BaseModel):
+    origins: list[Location] = Field(..., min_length=1, max_length=2000)
+    destinations: list[Location] = Field(..., min_length=1, max_length=2000)
+
+class MatrixResponse(BaseModel):
+    origin_nodes: list[str]
+    destination_nodes: list[str]
+    rows: int
+    cols: int
+    # Row-major km, origins x destinations; null where a destination is unreachable
+    distances_km: list[Optional[float]]
+
+class EdgeWeightUpdate(BaseModel):
+    from_node: str
+    to_node: str
+    # Cost multiplier on the road's length; 1 restores free flow
+    factor: float = Field(..., ge=1)
+
+class EdgeWeightsRequest(BaseModel):
+    updates: list[EdgeWeightUpdate] = Field(default_factory=list, max_length=100000)
+    reset: bool = False  # restore every road to free flow before applying updates
+
+# Routes per chunk written to a batch response stream
+BATCH_STREAM_CHUNK = 256
 
 # Initialize service with data dir
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
 settings = get_settings()
-routing_service = RoutingService(DATA_DIR, college_lat=settings.COLLEGE_LAT, college_lng=settings.COLLEGE_LNG)
+routing_service = RoutingService(DATA_DIR, college_lat=settings.COLLEGE_LAT, college_lng=settings.COLLEGE_LNG,
+                                 use_contraction_hierarchy=settings.ROUTING_CONTRACTION_HIERARCHY,
+                                 default_algorithm=settings.ROUTING_ALGORITHM,
+                                 destinations=settings.routing_destinations)
+osrm_service = OSRMService(settings.OSRM_BASE_URL, timeout=settings.OSRM_TIMEOUT_SECONDS,
+                           max_connections=settings.OSRM_MAX_CONNECTIONS, cache_size=settings.OSRM_CACHE_SIZE,
+                           cache_ttl=settings.OSRM_CACHE_TTL_SECONDS)
+graph_payloads = PayloadCache()
+
+# Clients may reuse /graph this long before revalidating with If-None-Match
+GRAPH_MAX_AGE = 300
 
 def generate_realistic_hostelites(route_points: list[Point], destination: Point) -> list[Hostelite]:
     """Generate hostelites near the actual route path"""
@@ -71,15 +124,94 @@ def generate_realistic_hostelites(route_points: list[Point], destination: Point)
 async def shortest_path(req: ShortestPathRequest):
     try:
         # Use configured college location
+        depart_minute = None
+        if req.departure_time is not None:
+            depart_minute = req.departure_time.hour * 60 + req.departure_time.minute + req.departure_time.second / 60
         res = routing_service.shortest_path_to_college(
             start_lat=req.start_location.latitude,
-            start_lng=req.start_location.longitude
+            start_lng=req.start_location.longitude,
+            algorithm=req.algorithm,
+            depart_minute=depart_minute
         )
         if not res["nodes"]:
             raise HTTPException(status_code=404, detail="No route found")
         return res
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/shortest-path/batch")
+async def shortest_path_batch(req: BatchShortestPathRequest):
+    """
+    Routes from many start locations to the college, streamed as NDJSON.
+
+    Each line is a ShortestPathResponse plus the "index" of its start location,
+    or {"index": i, "error": ...} when that start cannot reach the college.
+    """
+    try:
+        coords = [(loc.latitude, loc.longitude) for loc in req.start_locations]
+        # Snapping every start and building the college tree (when missing) are CPU work; errors
+        # still surface here as a status code rather than mid-stream
+        routes = await run_in_threadpool(routing_service.shortest_paths_to_college, coords)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def lines():
+        # Sync generator: Starlette iterates it in a worker thread, off the event loop
+        chunk = []
+        for i, res in enumerate(routes):
+            item = {"index": i, **res} if res["nodes"] else {"index": i, "error": "No route found"}
+            chunk.append(json.dumps(item))
+            if len(chunk) == BATCH_STREAM_CHUNK:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def _matrix_body(origins: list[tuple[float, float]], destinations: list[tuple[float, float]]) -> bytes:
+    """MatrixResponse encoded straight to JSON: a 2000 x 2000 table is too big to validate element by element"""
+    origin_nodes, destination_nodes, matrix = routing_service.distance_matrix(origins, destinations)
+    flat = matrix.round(3).ravel().tolist()
+    return json.dumps({
+        "origin_nodes": origin_nodes,
+        "destination_nodes": destination_nodes,
+        "rows": matrix.shape[0],
+        "cols": matrix.shape[1],
+        "distances_km": [None if d == float('inf') else d for d in flat]
+    }, separators=(",", ":")).encode("utf-8")
+
+@router.post("/matrix", response_model=MatrixResponse)
+async def distance_matrix(req: MatrixRequest):
+    """Road distance table between two sets of locations, computed with shared searches"""
+    try:
+        body = await run_in_threadpool(
+            _matrix_body,
+            [(loc.latitude, loc.longitude) for loc in req.origins],
+            [(loc.latitude, loc.longitude) for loc in req.destinations]
+        )
+        # Returned as-is; response_model only documents the shape
+        return Response(content=body, media_type="application/json")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/edge-weights")
+async def update_edge_weights(req: EdgeWeightsRequest, current_user: dict = Depends(get_current_operator)):
+    """Apply live congestion to roads (operators only); routing state is swapped atomically without a restart"""
+    try:
+        updates = [(u.from_node, u.to_node, u.factor) for u in req.updates]
+        # Rebuilding weights and repairing destination trees is CPU work: keep it off the event loop
+        return await run_in_threadpool(routing_service.update_edge_weights, updates, reset=req.reset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -93,25 +225,12 @@ async def college_location():
 async def shortest_path_osrm(req: ShortestPathRequest):
     """Compute a driving route using the public OSRM service and return a geojson-style path list [[lat,lng], ...]."""
     try:
-        start_lat = req.start_location.latitude
-        start_lng = req.start_location.longitude
-        end_lat = settings.COLLEGE_LAT
-        end_lng = settings.COLLEGE_LNG
-
-        coords = f"{start_lng},{start_lat};{end_lng},{end_lat}"
-        url = f"https://router.project-osrm.org/route/v1/driving/{coords}"
-        params = {"overview": "full", "geometries": "geojson"}
-
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(url, params=params)
-        resp.raise_for_status()
-        data = resp.json()
-        if not data.get("routes"):
+        route = await osrm_service.route(req.start_location.latitude, req.start_location.longitude,
+                                         settings.COLLEGE_LAT, settings.COLLEGE_LNG)
+        if route is None:
             raise HTTPException(status_code=404, detail="No route returned from OSRM")
-        route = data["routes"][0]
-        distance_km = route.get("distance", 0) / 1000.0
-        coords_lnglat = route["geometry"]["coordinates"]  # [[lng,lat], ...]
-        path = [[lat, lng] for lng, lat in coords_lnglat]
+        distance_km = route["distance_km"]
+        path = route["path"]
         return {"start_node": None, "end_node": None, "distance_km": round(distance_km, 3), "nodes": [], "path": path}
     except HTTPException:
         raise
@@ -180,7 +299,7 @@ async def find_corridor_matches(req: CorridorMatchRequest):
         destination = Point(lat=req.rider_destination.latitude, lng=req.rider_destination.longitude)
         
         # Create matcher with specified corridor width
-        matcher = GeometricCorridorMatcher(corridor_width_meters=req.corridor_width_meters)
+        matcher = GeometricCorridorMatcher(corridor_width_meters=req.corridor_width_meters, vectorized=True)
         
         # Generate realistic hostelites near the actual route
         college_dest = Point(lat=req.rider_destination.latitude, lng=req.rider_destination.longitude)
@@ -213,18 +332,18 @@ async def find_corridor_matches(req: CorridorMatchRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Matching failed: {str(e)}")
 
+def _graph_payload() -> CachedBody:
+    with open(routing_service.graph_path, 'r', encoding='utf-8') as f:
+        return CachedBody.json(json.load(f))
+
 @router.get("/graph")
-async def campus_graph():
+async def campus_graph(request: Request):
     """Return the campus graph (nodes and edges) so clients can visualize the network."""
-    graph_path = os.path.join(DATA_DIR, 'campus_graph.json')
-    if not os.path.exists(graph_path):
-        raise HTTPException(status_code=404, detail="Campus graph not found")
     try:
-        with open(graph_path, 'r', encoding='utf-8') as f:
-            data = f.read()
-        # return raw JSON parsed by FastAPI
-        from fastapi.responses import JSONResponse
-        import json as _json
-        return JSONResponse(content=_json.loads(data))
+        # Encoded once per loaded graph; reload_graph() changes the fingerprint
+        payload = graph_payloads.get("graph", routing_service.graph_fingerprint, _graph_payload)
+        return cached_response(request, payload, GRAPH_MAX_AGE)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Campus graph not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime, time
 from typing import Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from ..models.ride_model import RideStatus, Location
 
 class CreateRideRequest(BaseModel):
@@ -27,19 +27,88 @@ class RideResponse(BaseModel):
     number_of_passengers: int
     estimated_fare: float
     special_requirements: Optional[str]
+    schedule_id: Optional[str] = None
     created_at: datetime
     updated_at: datetime
+    distance_km: Optional[float] = None  # from the searcher, in nearby results
 
 class NearbyRidesRequest(BaseModel):
     current_location: Location
     max_distance: float = Field(ge=0, le=50)  # Maximum distance in kilometers
     time_window: int = Field(ge=0, le=120)    # Time window in minutes
     status: Optional[List[RideStatus]] = None  # Filter by specific statuses
+    skip: int = Field(0, ge=0)                 # Rides to skip (nearest first), for paging
+    limit: int = Field(20, ge=1, le=100)       # Page size
 
 class NearbyRidesResponse(BaseModel):
     rides: List[RideResponse]
     total_count: int
+    next_skip: Optional[int] = None  # skip value for the next page, None on the last page
 
 class UserRidesResponse(BaseModel):
     rides: List[RideResponse]
     total_count: int
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page, None on the last page
+
+
+class RideStatusUpdate(BaseModel):
+    ride_id: str
+    status: RideStatus
+
+class BulkStatusUpdateRequest(BaseModel):
+    updates: List[RideStatusUpdate] = Field(..., min_length=1, max_length=100)
+
+class BulkStatusUpdateResponse(BaseModel):
+    requested: int
+    updated: int
+    not_updated: List[str]  # rides missing, not the caller's, or not allowed to move to the requested status
+
+class RecurringRideRequest(BaseModel):
+    pickup_location: Location
+    dropoff_location: Location
+    pickup_time: time                      # local time of day, e.g. 08:30
+    weekdays: List[int] = Field(..., min_length=1, max_length=7)  # 0 = Monday ... 6 = Sunday
+    start_date: date
+    end_date: date                         # inclusive
+    utc_offset_minutes: int = Field(330, ge=-720, le=840)  # offset of the local time (IST by default)
+    number_of_passengers: int = Field(ge=1, le=4)
+    special_requirements: Optional[str] = None
+
+    @field_validator('weekdays')
+    def validate_weekdays(cls, v):
+        if any(day < 0 or day > 6 for day in v):
+            raise ValueError('Weekdays must be between 0 (Monday) and 6 (Sunday)')
+        return sorted(set(v))
+
+    @field_validator('pickup_time')
+    def validate_pickup_time(cls, v):
+        # The offset comes from utc_offset_minutes; an offset on the time itself would be ambiguous
+        if v.tzinfo is not None:
+            raise ValueError('pickup_time must be a local time without a UTC offset; use utc_offset_minutes')
+        return v
+
+class RecurringRidesResponse(BaseModel):
+    schedule_id: str
+    rides: List[RideResponse]
+    total_count: int
+
+class Coordinates(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class FareQuoteItem(BaseModel):
+    pickup: Coordinates
+    dropoff: Coordinates
+    number_of_passengers: int = Field(1, ge=1, le=4)
+
+class FareQuoteRequest(BaseModel):
+    rides: List[FareQuoteItem] = Field(..., min_length=1, max_length=1000)
+
+class FareQuote(BaseModel):
+    distance_km: float
+    estimated_fare: float
+    road_distance: bool  # False when the road graph could not connect the two points
+
+class FareQuoteResponse(BaseModel):
+    quotes: List[FareQuote]  # in request order
+    total_count: int
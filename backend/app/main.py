@@ -1,4 +1,5 @@
 # FastAPI entry point
+import asyncio
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
@@ -8,6 +9,7 @@ from app.controllers import auth_controller
 from app.controllers import routing_controller
 from app.controllers import network_controller
 from app.config import get_db, get_settings
+from app.services.ride_service import RideService
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from app.utils.rate_limiter import limiter, rate_limit_middleware
@@ -62,9 +64,30 @@ async def startup_event():
     """Initialize database connection on startup"""
     try:
         # Initialize database connection
-        await get_db()
+        db = await get_db()
+        await RideService(db.rides).ensure_indexes()
+        if ride_controller.live_ride_index is not None:
+            ride_controller.live_ride_index.start(db.rides)
     except Exception as e:
         print(f" MongoDB connection failed: {e}")
+    # Render the network image in the background so the first request finds it ready.
+    # The loop only keeps weak references to tasks, so this one is held on app.state
+    app.state.network_prerender = asyncio.create_task(network_controller.network_image.get())
+    app.state.network_prerender.add_done_callback(_prerender_done)
+
+def _prerender_done(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Network image pre-render failed: {task.exception()!r}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled outbound HTTP connections and stop background sync"""
+    await routing_controller.osrm_service.aclose()
+    prerender = getattr(app.state, "network_prerender", None)
+    if prerender is not None and not prerender.done():
+        prerender.cancel()
+    if ride_controller.live_ride_index is not None:
+        await ride_controller.live_ride_index.stop()
 
 # Register controllers (routers)
 app.include_router(ride_controller.router)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, FrozenSet, Optional
 from pydantic import BaseModel, Field
 from bson import ObjectId
 from enum import Enum
@@ -11,9 +11,23 @@ class RideStatus(str, Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+# Statuses a ride may move to from each status
+RIDE_STATUS_TRANSITIONS: Dict[RideStatus, FrozenSet[RideStatus]] = {
+    RideStatus.PENDING: frozenset({RideStatus.ACCEPTED, RideStatus.CANCELLED}),
+    RideStatus.ACCEPTED: frozenset({RideStatus.IN_PROGRESS, RideStatus.CANCELLED}),
+    RideStatus.IN_PROGRESS: frozenset({RideStatus.COMPLETED}),
+    RideStatus.COMPLETED: frozenset(),
+    RideStatus.CANCELLED: frozenset(),
+}
+
+def statuses_leading_to(status: RideStatus) -> list:
+    """Statuses from which a ride may move to status"""
+    return [source for source, targets in RIDE_STATUS_TRANSITIONS.items() if status in targets]
+
 class Location(BaseModel):
-    latitude: float
-    longitude: float
+    # Bounded so every stored pickup is a valid GeoJSON point for the 2dsphere index
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
     address: str
 
 class RideModel(BaseModel):
@@ -27,8 +41,11 @@ class RideModel(BaseModel):
     number_of_passengers: int = Field(ge=1, le=4)
     estimated_fare: float
     special_requirements: Optional[str] = None
+    schedule_id: Optional[str] = None  # recurring schedule the ride was booked from
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Distance from the searcher, filled in by nearby queries and never stored
+    distance_km: Optional[float] = Field(None, exclude=True)
 
     class Config:
         json_schema_extra = {
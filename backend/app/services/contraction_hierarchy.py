@@ -0,0 +1,379 @@
+"""
+Contraction Hierarchies for the routing graph.
+
+Preprocessing contracts nodes one at a time in order of importance (edge
+difference + contracted neighbours). Contracting a node adds a shortcut
+between two of its neighbours whenever no witness path avoiding the node is
+as short. A query then runs a bidirectional Dijkstra that only relaxes edges
+towards higher-ranked nodes and unpacks shortcuts back into graph nodes.
+
+The routing graph is undirected, so a single upward adjacency serves both
+the forward and the backward search. Like RoadGraph, the upward graph is
+stored in CSR arrays with one extra array naming the node each shortcut
+bypasses (-1 for original roads).
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Tuple, Optional, Sequence
+import heapq
+import os
+import numpy as np
+from app.services.road_graph import RoadGraph, to_array
+
+FORMAT_VERSION = 2
+
+
+class ContractionHierarchy:
+    # Witness searches give up after settling this many nodes (extra shortcuts are harmless)
+    WITNESS_SETTLE_LIMIT = 64
+    # Source/bucket pairs joined per many_to_many step (bounds temporary array memory)
+    MATRIX_CHUNK_PAIRS = 1 << 22
+
+    def __init__(self, node_ids: List[str], rank: Sequence[int], up_offsets: Sequence[int],
+                 up_targets: Sequence[int], up_weights: Sequence[float], up_middle: Sequence[int],
+                 fingerprint: str = ""):
+        self.node_ids = node_ids
+        self.index = {nid: i for i, nid in enumerate(node_ids)}
+        self.rank = rank
+        # Upward CSR: edges and shortcuts from u to higher-ranked nodes
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_weights = up_weights
+        self.up_middle = up_middle  # contracted node a shortcut bypasses, -1 for original edges
+        self.fingerprint = fingerprint
+
+    @property
+    def shortcut_count(self) -> int:
+        return sum(1 for m in self.up_middle if m >= 0)
+
+    # ------------------------------------------------------------------ build
+
+    @classmethod
+    def build(cls, road: RoadGraph, fingerprint: str = "",
+              order: Optional[Sequence[int]] = None) -> "ContractionHierarchy":
+        """
+        Contract road; order (a previous hierarchy's rank) skips node ordering,
+        which makes re-contracting after weight changes considerably cheaper.
+        """
+        n = road.node_count
+        adj: List[Dict[int, float]] = [{} for _ in range(n)]
+        for a in range(n):
+            for b, w in road.neighbours(a).items():
+                if a != b and w < adj[a].get(b, float('inf')):
+                    adj[a][b] = w
+                    adj[b][a] = w
+
+        middle: Dict[Tuple[int, int], int] = {}
+        up: List[Dict[int, float]] = [{} for _ in range(n)]
+        rank = [0] * n
+        contracted_neighbours = [0] * n
+        contracted = [False] * n
+
+        def shortcuts_for(v: int) -> List[Tuple[int, int, float]]:
+            """Shortcuts needed if v were contracted now"""
+            neighbours = list(adj[v].items())
+            needed = []
+            for i, (u, wu) in enumerate(neighbours):
+                targets = {x: wu + wx for x, wx in neighbours[i + 1:]}
+                if not targets:
+                    continue
+                witness = cls._witness_search(adj, u, v, targets, max(targets.values()))
+                for x, via in targets.items():
+                    if witness.get(x, float('inf')) > via:
+                        needed.append((u, x, via))
+            return needed
+
+        def priority(v: int, shortcuts: List[Tuple[int, int, float]]) -> int:
+            return len(shortcuts) - len(adj[v]) + contracted_neighbours[v]
+
+        if order is None:
+            queue = [(priority(v, shortcuts_for(v)), v) for v in range(n)]
+        else:
+            queue = [(order[v], v) for v in range(n)]
+        heapq.heapify(queue)
+        level = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            if contracted[v]:
+                continue
+            shortcuts = shortcuts_for(v)
+            if order is None:
+                # Lazy update: re-evaluate and requeue if v is no longer the cheapest
+                current = priority(v, shortcuts)
+                if queue and current > queue[0][0]:
+                    heapq.heappush(queue, (current, v))
+                    continue
+
+            for u, x, via in shortcuts:
+                if via < adj[u].get(x, float('inf')):
+                    adj[u][x] = via
+                    adj[x][u] = via
+                    middle[(min(u, x), max(u, x))] = v
+
+            up[v] = dict(adj[v])
+            for u in adj[v]:
+                del adj[u][v]
+                contracted_neighbours[u] += 1
+            adj[v] = {}
+            contracted[v] = True
+            rank[v] = level
+            level += 1
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum([len(edges) for edges in up], out=offsets[1:])
+        targets = [v for edges in up for v in edges]
+        weights = [w for edges in up for w in edges.values()]
+        mids = [middle.get((min(u, v), max(u, v)), -1) for u, edges in enumerate(up) for v in edges]
+        return cls(road.node_ids, to_array('i', np.array(rank)), to_array('q', offsets),
+                   to_array('i', np.array(targets)), to_array('d', np.array(weights, dtype=np.float64)),
+                   to_array('i', np.array(mids)), fingerprint)
+
+    @classmethod
+    def _witness_search(cls, adj: List[Dict[int, float]], source: int, skip: int,
+                        targets: Dict[int, float], limit: float) -> Dict[int, float]:
+        """
+        Bounded Dijkstra from source that ignores skip.
+
+        Returns tentative distances: every entry is the length of a real path
+        avoiding skip, so any of them can serve as a witness.
+        """
+        dist = {source: 0.0}
+        settled = set()
+        pq = [(0.0, source)]
+        remaining = len(targets)
+        while pq and len(settled) < cls.WITNESS_SETTLE_LIMIT:
+            d, u = heapq.heappop(pq)
+            if d > limit:
+                break
+            if u in settled:
+                continue
+            settled.add(u)
+            if u in targets:
+                remaining -= 1
+                if remaining == 0:
+                    break
+            for v, w in adj[u].items():
+                if v == skip:
+                    continue
+                nd = d + w
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    heapq.heappush(pq, (nd, v))
+        return dist
+
+    # ------------------------------------------------------------------ query
+
+    def query(self, start_id: str, end_id: str) -> Tuple[float, List[str]]:
+        """Bidirectional upward search; same contract as RoutingService.dijkstra"""
+        total_km, path_ids, _ = self.search(start_id, end_id)
+        return total_km, path_ids
+
+    def search(self, start_id: str, end_id: str) -> Tuple[float, List[str], int]:
+        """query that also reports how many nodes were settled"""
+        total_km, path, settled = self.search_indices(self.index[start_id], self.index[end_id])
+        return total_km, [self.node_ids[i] for i in path], settled
+
+    def search_indices(self, s: int, t: int) -> Tuple[float, List[int], int]:
+        """search on node indices; returns (distance_km, path indices, settled nodes)"""
+        if s == t:
+            return 0.0, [s], 1
+
+        offsets, targets, weights = self.up_offsets, self.up_targets, self.up_weights
+        dist = ({s: 0.0}, {t: 0.0})
+        parent: Tuple[Dict[int, int], Dict[int, int]] = ({}, {})
+        queues = ([(0.0, s)], [(0.0, t)])
+        best, meet = float('inf'), -1
+        side = 0
+        settled = 0
+        while queues[0] or queues[1]:
+            # Stop a direction once its smallest key cannot improve the best meeting
+            if not queues[side] or queues[side][0][0] >= best:
+                side ^= 1
+                if not queues[side] or queues[side][0][0] >= best:
+                    break
+            d, u = heapq.heappop(queues[side])
+            if d > dist[side][u]:
+                side ^= 1
+                continue
+            settled += 1
+            other = dist[side ^ 1].get(u)
+            if other is not None and d + other < best:
+                best, meet = d + other, u
+            mine = dist[side]
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < mine.get(v, float('inf')):
+                    mine[v] = nd
+                    parent[side][v] = u
+                    heapq.heappush(queues[side], (nd, v))
+            side ^= 1
+
+        if meet == -1:
+            return float('inf'), [], settled
+
+        forward = [meet]
+        while forward[-1] != s:
+            forward.append(parent[0][forward[-1]])
+        forward.reverse()
+        backward = [meet]
+        while backward[-1] != t:
+            backward.append(parent[1][backward[-1]])
+
+        hops = forward + backward[1:]
+        path = [s]
+        for a, b in zip(hops, hops[1:]):
+            self._unpack(a, b, path)
+        return best, path, settled
+
+    def upward_space(self, s: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (nodes, distances) settled by an unbounded upward search from s.
+
+        Uses stall-on-demand: a node reachable more cheaply through a
+        higher-ranked neighbour is not on any shortest up-path, so it is
+        neither expanded nor returned.
+        """
+        offsets, targets, weights = self.up_offsets, self.up_targets, self.up_weights
+        inf = float('inf')
+        dist = {s: 0.0}
+        nodes: List[int] = []
+        dists: List[float] = []
+        pq = [(0.0, s)]
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d > dist[u]:
+                continue
+            edges = range(offsets[u], offsets[u + 1])
+            # Every label is the length of a real path, so any neighbour label can stall u
+            if any(dist.get(targets[e], inf) + weights[e] < d for e in edges):
+                continue
+            nodes.append(u)
+            dists.append(d)
+            for e in edges:
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < dist.get(v, inf):
+                    dist[v] = nd
+                    heapq.heappush(pq, (nd, v))
+        return np.array(nodes, dtype=np.int64), np.array(dists, dtype=np.float64)
+
+    def many_to_many(self, sources: Sequence[int], targets: Sequence[int]) -> np.ndarray:
+        """
+        Distance table (len(sources) x len(targets), inf when unreachable).
+
+        Bucket-based: the upward space of every target is stored in per-node
+        buckets, then each source's upward space is joined against them. A
+        shortest path always peaks at a node both spaces share, so the table
+        is the min over shared nodes of forward + backward distance.
+        """
+        n_targets = len(targets)
+        table = np.full(len(sources) * n_targets, np.inf)
+        if not len(sources) or not n_targets:
+            return table.reshape(len(sources), n_targets)
+
+        # Buckets: all (node, target column, distance) entries grouped by node
+        spaces = [self.upward_space(t) for t in targets]
+        b_node = np.concatenate([nodes for nodes, _ in spaces])
+        b_col = np.repeat(np.arange(n_targets), [len(nodes) for nodes, _ in spaces])
+        b_dist = np.concatenate([dists for _, dists in spaces])
+        order = np.argsort(b_node, kind='stable')
+        b_node, b_col, b_dist = b_node[order], b_col[order], b_dist[order]
+        n = len(self.node_ids)
+        b_start = np.searchsorted(b_node, np.arange(n))
+        b_count = np.searchsorted(b_node, np.arange(n), side='right') - b_start
+
+        def join(rows: List[int], spaces: List[Tuple[np.ndarray, np.ndarray]]) -> None:
+            f_node = np.concatenate([nodes for nodes, _ in spaces])
+            f_row = np.repeat(rows, [len(nodes) for nodes, _ in spaces])
+            f_dist = np.concatenate([dists for _, dists in spaces])
+            count = b_count[f_node]
+            total = int(count.sum())
+            if total == 0:
+                return
+            # Index of every bucket entry paired with each forward entry
+            first = np.cumsum(count) - count
+            slot = np.arange(total) - np.repeat(first - b_start[f_node], count)
+            np.minimum.at(table, np.repeat(f_row, count) * n_targets + b_col[slot],
+                          np.repeat(f_dist, count) + b_dist[slot])
+
+        # Join a group of sources at a time to bound the size of the pair arrays
+        rows: List[int] = []
+        pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        pairs = 0
+        for row, s in enumerate(sources):
+            space = self.upward_space(s)
+            rows.append(row)
+            pending.append(space)
+            pairs += int(b_count[space[0]].sum())
+            if pairs >= self.MATRIX_CHUNK_PAIRS:
+                join(rows, pending)
+                rows, pending, pairs = [], [], 0
+        if rows:
+            join(rows, pending)
+        return table.reshape(len(sources), n_targets)
+
+    def _middle(self, u: int, v: int) -> int:
+        """Node bypassed by the upward edge between u and v (-1 for an original edge)"""
+        if self.rank[u] > self.rank[v]:
+            u, v = v, u
+        targets = self.up_targets
+        for e in range(self.up_offsets[u], self.up_offsets[u + 1]):
+            if targets[e] == v:
+                return self.up_middle[e]
+        raise KeyError((u, v))
+
+    def _unpack(self, a: int, b: int, path: List[int]) -> None:
+        """Append the graph nodes of edge a->b (excluding a) to path"""
+        stack = [(a, b)]
+        while stack:
+            u, v = stack.pop()
+            mid = self._middle(u, v)
+            if mid == -1:
+                path.append(v)
+            else:
+                stack.append((mid, v))
+                stack.append((u, mid))
+
+    # ------------------------------------------------------------ persistence
+
+    def save(self, path: str) -> None:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                version=np.array(FORMAT_VERSION),
+                fingerprint=np.array(self.fingerprint),
+                node_ids=np.array(self.node_ids, dtype=str),
+                rank=np.asarray(self.rank, dtype=np.int32),
+                up_offsets=np.asarray(self.up_offsets, dtype=np.int64),
+                up_targets=np.asarray(self.up_targets, dtype=np.int32),
+                up_weights=np.asarray(self.up_weights, dtype=np.float64),
+                up_middle=np.asarray(self.up_middle, dtype=np.int32),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, fingerprint: Optional[str] = None) -> Optional["ContractionHierarchy"]:
+        """Load a saved hierarchy; returns None if missing, outdated or built from another graph"""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data['version']) != FORMAT_VERSION:
+                return None
+            if fingerprint is not None and str(data['fingerprint']) != fingerprint:
+                return None
+            return cls(data['node_ids'].tolist(), to_array('i', data['rank']), to_array('q', data['up_offsets']),
+                       to_array('i', data['up_targets']), to_array('d', data['up_weights']),
+                       to_array('i', data['up_middle']), str(data['fingerprint']))
+
+
+if __name__ == "__main__":
+    # Preprocess the bundled graph: python -m app.services.contraction_hierarchy
+    from app.services.routing_service import RoutingService
+
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+    service = RoutingService(data_dir)
+    ch = service.prepare_contraction_hierarchy(rebuild=True)
+    shortcuts = ch.shortcut_count
+    print(f"Contracted {len(ch.node_ids)} nodes ({shortcuts} shortcuts) -> {service.ch_path}")
@@ -13,13 +13,17 @@ It combines concepts from:
 
 Time Complexity: O(n * m) where n = number of hostelites, m = number of route points
 Space Complexity: O(n) for storing matches
+
+The vectorized mode evaluates the same n * m point-to-segment distances with
+NumPy in chunks, so the work stays O(n * m) but runs in compiled code.
 """
 
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
-from math import radians, sin, cos, sqrt, atan2, degrees, atan
+from typing import Dict, List, Tuple, Optional, Union
+from math import radians, sin, cos, sqrt, atan2, degrees, atan, floor
 import json
+import numpy as np
 
 @dataclass
 class Point:
@@ -44,6 +48,194 @@ class CorridorMatch:
     pickup_order: int
     estimated_pickup_time_minutes: float
 
+class PreparedRoute:
+    """
+    Route polyline with a bounding-box tree (packed R-tree) over its segments.
+
+    Each segment's box is widened by the corridor width, so a hostelite can only
+    be inside the corridor of segments whose box contains it. Built once per
+    route and reused across calls with different hostelite batches.
+    """
+
+    NODE_CAPACITY = 8
+
+    def __init__(self, route_points: List[Point], corridor_width_meters: float, earth_radius_km: float = 6371.0):
+        self.route_points = route_points
+        self.corridor_width = corridor_width_meters
+
+        route = np.array([(p.lat, p.lng) for p in route_points], dtype=np.float64).reshape(-1, 2)
+        self.seg_lat, self.seg_lng = route[:-1, 0], route[:-1, 1]
+        self.C = route[1:, 0] - self.seg_lat
+        self.D = route[1:, 1] - self.seg_lng
+        length_squared = self.C * self.C + self.D * self.D
+        self.degenerate = length_squared == 0
+        self.safe_length_squared = np.where(self.degenerate, 1.0, length_squared)
+
+        # Widen by the corridor width; great-circle distance is at least R * dlat and
+        # R * cos(lat) * dlng, so using the widest latitude keeps the boxes conservative
+        meters_per_degree = radians(1) * earth_radius_km * 1000
+        lat_margin = corridor_width_meters / meters_per_degree * 1.01
+        min_lat = np.minimum(route[:-1, 0], route[1:, 0]) - lat_margin
+        max_lat = np.maximum(route[:-1, 0], route[1:, 0]) + lat_margin
+        widest = np.cos(np.radians(np.minimum(np.maximum(np.abs(min_lat), np.abs(max_lat)), 89.0)))
+        lng_margin = lat_margin / widest
+        min_lng = np.minimum(route[:-1, 1], route[1:, 1]) - lng_margin
+        max_lng = np.maximum(route[:-1, 1], route[1:, 1]) + lng_margin
+        self.boxes = np.stack([min_lat, min_lng, max_lat, max_lng], axis=1)
+
+        self._build_tree()
+
+    def __len__(self) -> int:
+        return len(self.seg_lat)
+
+    def _build_tree(self) -> None:
+        """Sort-Tile-Recursive bulk load; levels[0] is the root level"""
+        M = self.NODE_CAPACITY
+        self.order = self._str_order(self.boxes)
+        boxes = self.boxes[self.order]
+        # Each level: (boxes, first_child, last_child) where children index the level below
+        # (or self.order for the leaf level)
+        levels = []
+        while True:
+            starts = np.arange(0, len(boxes), M)
+            ends = np.minimum(starts + M, len(boxes))
+            parents = np.stack([
+                np.minimum.reduceat(boxes[:, 0], starts),
+                np.minimum.reduceat(boxes[:, 1], starts),
+                np.maximum.reduceat(boxes[:, 2], starts),
+                np.maximum.reduceat(boxes[:, 3], starts),
+            ], axis=1) if len(boxes) else np.empty((0, 4))
+            levels.append((parents, starts, ends))
+            if len(parents) <= 1:
+                break
+            regroup = self._str_order(parents)
+            levels[-1] = (parents[regroup], starts[regroup], ends[regroup])
+            boxes = parents[regroup]
+        levels.reverse()
+        self.levels = levels
+
+    def _str_order(self, boxes: np.ndarray) -> np.ndarray:
+        """Order boxes into vertical slices by centre longitude, each sorted by centre latitude"""
+        M = self.NODE_CAPACITY
+        if len(boxes) == 0:
+            return np.arange(0)
+        centre_lat = (boxes[:, 0] + boxes[:, 2]) / 2
+        centre_lng = (boxes[:, 1] + boxes[:, 3]) / 2
+        leaves = -(-len(boxes) // M)
+        slice_size = M * int(np.ceil(np.sqrt(leaves)))
+        by_lng = np.argsort(centre_lng, kind='stable')
+        slices = [by_lng[i:i + slice_size] for i in range(0, len(by_lng), slice_size)]
+        return np.concatenate([s[np.argsort(centre_lat[s], kind='stable')] for s in slices])
+
+    def candidate_pairs(self, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (point_index, segment_index) pairs whose widened segment box contains the point.
+
+        Descends the tree for all points at once; a point that falls in no box
+        drops out after O(log m) box tests.
+        """
+        if len(self) == 0:
+            return np.arange(0), np.arange(0)
+        points = np.arange(len(lat))
+        nodes = np.zeros(len(lat), dtype=np.intp)
+        for depth, (boxes, starts, ends) in enumerate(self.levels):
+            inside = ((boxes[nodes, 0] <= lat[points]) & (lat[points] <= boxes[nodes, 2]) &
+                      (boxes[nodes, 1] <= lng[points]) & (lng[points] <= boxes[nodes, 3]))
+            points, nodes = points[inside], nodes[inside]
+            # Expand every surviving node into its children on the level below
+            counts = ends[nodes] - starts[nodes]
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            points = np.repeat(points, counts)
+            nodes = np.repeat(starts[nodes], counts) + offsets
+
+        segments = self.order[nodes]
+        box = self.boxes[segments]
+        inside = ((box[:, 0] <= lat[points]) & (lat[points] <= box[:, 2]) &
+                  (box[:, 1] <= lng[points]) & (lng[points] <= box[:, 3]))
+        return points[inside], segments[inside]
+
+class HosteliteGridIndex:
+    """
+    Live registry of hostelites bucketed by a uniform lat/lng grid.
+
+    Insert, move and remove are O(1) dict operations, so the index can follow
+    students as they update their home locations. A corridor query only visits
+    the grid cells under the route's widened segment boxes, so its cost depends
+    on the corridor area rather than on how many students are registered.
+    """
+
+    def __init__(self, cell_size_degrees: float = 0.01):  # ~1.1 km at Pune latitude
+        self.cell_size = cell_size_degrees
+        self._cells: Dict[Tuple[int, int], Dict[str, Hostelite]] = {}
+        self._cell_of: Dict[str, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._cell_of)
+
+    def __contains__(self, hostelite_id: str) -> bool:
+        return hostelite_id in self._cell_of
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return floor(lat / self.cell_size), floor(lng / self.cell_size)
+
+    def get(self, hostelite_id: str) -> Optional[Hostelite]:
+        cell = self._cell_of.get(hostelite_id)
+        return None if cell is None else self._cells[cell][hostelite_id]
+
+    def upsert(self, hostelite: Hostelite) -> None:
+        """Insert a hostelite, or replace it (re-bucketing if its location changed)"""
+        self.remove(hostelite.id)
+        cell = self._cell(hostelite.lat, hostelite.lng)
+        self._cells.setdefault(cell, {})[hostelite.id] = hostelite
+        self._cell_of[hostelite.id] = cell
+
+    def move(self, hostelite_id: str, lat: float, lng: float) -> Hostelite:
+        """Update a registered hostelite's home location"""
+        hostelite = self.get(hostelite_id)
+        if hostelite is None:
+            raise KeyError(hostelite_id)
+        hostelite.lat, hostelite.lng = lat, lng
+        self.upsert(hostelite)
+        return hostelite
+
+    def remove(self, hostelite_id: str) -> bool:
+        cell = self._cell_of.pop(hostelite_id, None)
+        if cell is None:
+            return False
+        bucket = self._cells[cell]
+        del bucket[hostelite_id]
+        if not bucket:
+            del self._cells[cell]
+        return True
+
+    def cells_for_route(self, prepared_route: PreparedRoute) -> set:
+        """Occupied grid cells that intersect any of the route's widened segment boxes"""
+        cells = np.floor(prepared_route.boxes / self.cell_size).astype(np.int64)
+        area = int(((cells[:, 2] - cells[:, 0] + 1) * (cells[:, 3] - cells[:, 1] + 1)).sum()) if len(cells) else 0
+        if area > len(self._cells):
+            # Corridor covers more cells than are occupied: test the occupied cells instead
+            occupied = list(self._cells)
+            grid = np.array(occupied, dtype=np.int64).reshape(-1, 2)
+            hit = np.zeros(len(grid), dtype=bool)
+            step = max(1, (1 << 20) // max(1, len(cells)))
+            for begin in range(0, len(grid), step):
+                i = grid[begin:begin + step, 0:1]
+                j = grid[begin:begin + step, 1:2]
+                hit[begin:begin + step] = ((cells[:, 0] <= i) & (i <= cells[:, 2]) &
+                                           (cells[:, 1] <= j) & (j <= cells[:, 3])).any(axis=1)
+            return {occupied[k] for k in np.flatnonzero(hit)}
+        covered = set()
+        for lat0, lng0, lat1, lng1 in cells.tolist():
+            covered.update((i, j) for i in range(lat0, lat1 + 1) for j in range(lng0, lng1 + 1))
+        return covered & self._cells.keys()
+
+    def candidates(self, prepared_route: PreparedRoute) -> List[Hostelite]:
+        """Hostelites in the grid cells along the route's corridor"""
+        found = []
+        for cell in self.cells_for_route(prepared_route):
+            found.extend(self._cells[cell].values())
+        return found
+
 class GeometricCorridorMatcher:
     """
     Implements the Geometric Corridor Matching Algorithm
@@ -57,9 +249,13 @@ class GeometricCorridorMatcher:
        - Destination similarity
     """
     
-    def __init__(self, corridor_width_meters: float = 1000):
+    # Upper bound on hostelite x segment pairs evaluated per NumPy chunk (~8 MB per float array)
+    VECTOR_CHUNK_PAIRS = 1 << 16
+
+    def __init__(self, corridor_width_meters: float = 1000, vectorized: bool = False):
         self.corridor_width = corridor_width_meters
         self.earth_radius_km = 6371.0
+        self.vectorized = vectorized
         
     def haversine_distance(self, p1: Point, p2: Point) -> float:
         """Calculate great circle distance between two points in meters"""
@@ -102,7 +298,22 @@ class GeometricCorridorMatcher:
         distance = self.haversine_distance(point, closest_point)
         return distance, closest_point
     
-    def find_corridor_matches(self, route_points: List[Point], hostelites: List[Hostelite], 
+    def haversine_distance_array(self, lat1: np.ndarray, lng1: np.ndarray,
+                                 lat2: np.ndarray, lng2: np.ndarray) -> np.ndarray:
+        """Vectorized haversine_distance over broadcastable coordinate arrays (meters)"""
+        R = self.earth_radius_km * 1000
+        lat1, lng1, lat2, lng2 = np.radians(lat1), np.radians(lng1), np.radians(lat2), np.radians(lng2)
+        dlat = lat2 - lat1
+        dlon = lng2 - lng1
+        h = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+        c = 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+        return R * c
+
+    def prepare_route(self, route_points: List[Point]) -> PreparedRoute:
+        """Build a reusable segment index for route_points at this matcher's corridor width"""
+        return PreparedRoute(route_points, self.corridor_width, self.earth_radius_km)
+
+    def find_corridor_matches(self, route_points: Union[List[Point], PreparedRoute], hostelites: List[Hostelite], 
                             rider_destination: Point) -> List[CorridorMatch]:
         """
         Main algorithm: Geometric Corridor Matching with Greedy Selection
@@ -114,7 +325,15 @@ class GeometricCorridorMatcher:
         4. Create match with metrics for greedy selection
         
         Greedy Strategy: Select based on route order first, then distance
+
+        route_points may be a PreparedRoute (see prepare_route), in which case
+        each hostelite is only tested against segments near it.
         """
+        if isinstance(route_points, PreparedRoute):
+            return self.find_prepared_route_matches(route_points, hostelites, rider_destination)
+        if self.vectorized:
+            return self.find_corridor_matches_vectorized(route_points, hostelites, rider_destination)
+
         matches = []
         
         for hostelite in hostelites:
@@ -154,10 +373,175 @@ class GeometricCorridorMatcher:
                 )
                 matches.append(match)
         
-        # Greedy Selection: Sort by route position first, then by distance
+        return self._rank_matches(matches)
+
+    def find_corridor_matches_vectorized(self, route_points: List[Point], hostelites: List[Hostelite],
+                                         rider_destination: Point) -> List[CorridorMatch]:
+        """
+        Batch variant of find_corridor_matches that returns the same matches.
+
+        The route is turned into segment arrays and the hostelites into
+        coordinate arrays; every point-to-segment projection and haversine
+        distance is then computed in bulk, a chunk of hostelites at a time.
+        argmin keeps the first minimum, which mirrors the strict '<' tie
+        break of the scalar loop.
+        """
+        if len(route_points) < 2 or not hostelites:
+            return []
+
+        route = np.array([(p.lat, p.lng) for p in route_points], dtype=np.float64)
+        seg_lat, seg_lng = route[:-1, 0], route[:-1, 1]
+        C = route[1:, 0] - seg_lat
+        D = route[1:, 1] - seg_lng
+        length_squared = C * C + D * D
+        degenerate = length_squared == 0
+        safe_length_squared = np.where(degenerate, 1.0, length_squared)
+
+        coords, candidates = self._destination_candidates(hostelites, rider_destination)
+
+        meters_per_degree = radians(1) * self.earth_radius_km * 1000
+        n_segments = len(seg_lat)
+        chunk = max(1, self.VECTOR_CHUNK_PAIRS // n_segments)
+        matches = []
+
+        for begin in range(0, len(candidates), chunk):
+            rows = candidates[begin:begin + chunk]
+            lat = coords[rows, 0][:, None]
+            lng = coords[rows, 1][:, None]
+
+            # Projection parameter t in [0, 1] along every segment
+            t = (lat - seg_lat) * C
+            t += (lng - seg_lng) * D
+            t /= safe_length_squared
+            np.clip(t, 0, 1, out=t)
+            t[:, degenerate] = 0  # Segment is a point: project onto its start
+
+            # Closest points are formed in degrees exactly as the scalar path does,
+            # so a vertex shared by two segments yields identical coordinates and
+            # the tie resolves to the earlier segment.
+            closest_lat = t * C
+            closest_lat += seg_lat
+            closest_lng = t * D
+            closest_lng += seg_lng
+
+            # Cheap equirectangular pre-check: rows whose nearest segment is clearly
+            # outside the corridor can never match, so skip the trigonometry for them
+            rough = closest_lat - lat
+            rough *= rough
+            east = closest_lng - lng
+            east *= np.cos(np.radians(lat))
+            east *= east
+            rough += east
+            rough_min = np.sqrt(rough.min(axis=1)) * meters_per_degree
+            near = np.flatnonzero(rough_min <= self.corridor_width * 1.05 + 1.0)
+            if len(near) == 0:
+                continue
+            rows, lat, lng, t = rows[near], lat[near], lng[near], t[near]
+            closest_lat, closest_lng = closest_lat[near], closest_lng[near]
+
+            # Haversine term h grows monotonically with distance, so the nearest
+            # segment can be picked on h and the full formula applied only to it
+            lat_rad = np.radians(lat)
+            closest_lat_rad = np.radians(closest_lat, out=closest_lat)
+            dlon = np.radians(closest_lng, out=closest_lng)
+            dlon -= np.radians(lng)
+            h = np.subtract(closest_lat_rad, lat_rad)
+            h *= 0.5
+            np.sin(h, out=h)
+            h *= h
+            dlon *= 0.5
+            np.sin(dlon, out=dlon)
+            dlon *= dlon
+            dlon *= np.cos(closest_lat_rad, out=closest_lat_rad)
+            dlon *= np.cos(lat_rad)
+            h += dlon
+
+            best_index = np.argmin(h, axis=1)
+            picked = np.arange(len(rows))
+            best_t = t[picked, best_index]
+            pickup_lat = seg_lat[best_index] + best_t * C[best_index]
+            pickup_lng = seg_lng[best_index] + best_t * D[best_index]
+            min_distance = self.haversine_distance_array(lat[:, 0], lng[:, 0], pickup_lat, pickup_lng)
+
+            for k in np.flatnonzero(min_distance <= self.corridor_width):
+                i = int(best_index[k])
+                matches.append(CorridorMatch(
+                    hostelite=hostelites[rows[k]],
+                    distance_from_route=float(min_distance[k]),
+                    pickup_point=Point(lat=float(pickup_lat[k]), lng=float(pickup_lng[k])),
+                    route_index=i,
+                    pickup_order=0,  # Will be set during greedy selection
+                    estimated_pickup_time_minutes=i * 2  # 2 min per segment estimate
+                ))
+
+        return self._rank_matches(matches)
+
+    def find_prepared_route_matches(self, prepared_route: PreparedRoute, hostelites: List[Hostelite],
+                                    rider_destination: Point) -> List[CorridorMatch]:
+        """
+        Corridor matching against a PreparedRoute.
+
+        Only segments whose widened box contains a hostelite are measured. Any
+        segment outside those boxes is farther than the corridor width, so the
+        nearest candidate is the same segment the full scan would pick whenever
+        the hostelite is inside the corridor.
+        """
+        if prepared_route.corridor_width < self.corridor_width:
+            raise ValueError("Prepared route was built for a narrower corridor than this matcher uses")
+        if len(prepared_route) == 0 or not hostelites:
+            return []
+
+        coords, candidates = self._destination_candidates(hostelites, rider_destination)
+        lat, lng = coords[candidates, 0], coords[candidates, 1]
+        points, segments = prepared_route.candidate_pairs(lat, lng)
+
+        C, D = prepared_route.C[segments], prepared_route.D[segments]
+        seg_lat, seg_lng = prepared_route.seg_lat[segments], prepared_route.seg_lng[segments]
+        t = ((lat[points] - seg_lat) * C + (lng[points] - seg_lng) * D) / prepared_route.safe_length_squared[segments]
+        t = np.clip(t, 0, 1)
+        t[prepared_route.degenerate[segments]] = 0
+        pickup_lat = seg_lat + t * C
+        pickup_lng = seg_lng + t * D
+        distances = self.haversine_distance_array(lat[points], lng[points], pickup_lat, pickup_lng)
+
+        # Nearest segment per hostelite, earliest segment on ties
+        ranked = np.lexsort((segments, distances, points))
+        first = ranked[np.r_[True, points[ranked][1:] != points[ranked][:-1]]] if len(ranked) else ranked
+
+        matches = []
+        for k in first[distances[first] <= self.corridor_width]:
+            i = int(segments[k])
+            matches.append(CorridorMatch(
+                hostelite=hostelites[candidates[points[k]]],
+                distance_from_route=float(distances[k]),
+                pickup_point=Point(lat=float(pickup_lat[k]), lng=float(pickup_lng[k])),
+                route_index=i,
+                pickup_order=0,  # Will be set during greedy selection
+                estimated_pickup_time_minutes=i * 2  # 2 min per segment estimate
+            ))
+
+        return self._rank_matches(matches)
+
+    def find_indexed_matches(self, route: Union[List[Point], PreparedRoute], index: HosteliteGridIndex,
+                             rider_destination: Point) -> List[CorridorMatch]:
+        """Corridor matching over the hostelites registered in a HosteliteGridIndex"""
+        prepared_route = route if isinstance(route, PreparedRoute) else self.prepare_route(route)
+        return self.find_corridor_matches(prepared_route, index.candidates(prepared_route), rider_destination)
+
+    def _destination_candidates(self, hostelites: List[Hostelite], rider_destination: Point) -> Tuple[np.ndarray, np.ndarray]:
+        """Coordinate array [lat, lng, dest_lat, dest_lng] and indices of hostelites heading the rider's way"""
+        coords = np.array([(h.lat, h.lng, h.destination.lat, h.destination.lng) for h in hostelites],
+                          dtype=np.float64).reshape(-1, 4)
+
+        # Skip hostelites whose destination is too different (> 2km from rider's destination)
+        dest_distance = self.haversine_distance_array(coords[:, 2], coords[:, 3],
+                                                      rider_destination.lat, rider_destination.lng)
+        return coords, np.flatnonzero(~(dest_distance > 2000))
+
+    def _rank_matches(self, matches: List[CorridorMatch]) -> List[CorridorMatch]:
+        """Greedy Selection: sort by route position first, then by distance, and assign pickup orders"""
         matches.sort(key=lambda m: (m.route_index, m.distance_from_route))
         
-        # Assign pickup orders
         for i, match in enumerate(matches):
             match.pickup_order = i + 1
             
@@ -0,0 +1,138 @@
+"""
+Batch fare quotes priced on road distances.
+
+A fare is base + km * rate + a charge per extra passenger, where km is the
+road distance between the graph nodes nearest the pickup and dropoff plus
+the straight-line legs from the pickup to its node and from the dropoff's
+node to the dropoff. When either leg is longer than MAX_ACCESS_KM or than
+the trip itself, the graph does not cover the trip and the straight-line
+distance is used instead. Distances come from the compiled weights, never
+the congestion-scaled live ones. Quotes for a whole list are computed in
+one pass: points are snapped together, each distinct node pair is routed
+once, and the fares are numpy arithmetic over the arrays.
+
+Road distances are memoised per node pair (the graph is undirected, so
+(a, b) and (b, a) share an entry). The memo is tied to the loaded graph
+and is cleared when another one is loaded.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Optional, Sequence, Tuple
+import threading
+import numpy as np
+
+from app.services.road_graph import EARTH_RADIUS_KM
+from app.services.routing_service import RoutingService, RoutingState
+
+BASE_FARE = 50.0  # Base fare in rupees
+PER_KM_RATE = 12.0  # Rate per kilometer
+PER_PERSON_CHARGE = 10.0  # Additional charge per passenger after the first
+# Longest straight-line leg between a trip end and its nearest graph node still priced by road
+MAX_ACCESS_KM = 1.0
+
+Coordinates = Sequence[Tuple[float, float]]  # (lat, lng) pairs
+
+
+def haversine_many(lat1: np.ndarray, lng1: np.ndarray, lat2: np.ndarray, lng2: np.ndarray) -> np.ndarray:
+    """Element-wise great-circle distance in km between degree coordinate arrays"""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+class FareQuoteEngine:
+    def __init__(self, routing: RoutingService, memo_size: int = 100_000, base_fare: float = BASE_FARE,
+                 per_km_rate: float = PER_KM_RATE, per_person_charge: float = PER_PERSON_CHARGE):
+        self.routing = routing
+        self.memo_size = memo_size
+        self.base_fare = base_fare
+        self.per_km_rate = per_km_rate
+        self.per_person_charge = per_person_charge
+        self._memo: "OrderedDict[int, float]" = OrderedDict()  # node pair code -> road km
+        self._memo_key = ""  # graph fingerprint the memo was filled under
+        self._distance_state: Optional[RoutingState] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _free_flow(self, state: RoutingState) -> RoutingState:
+        """The state with its compiled weights: live updates scale weights by congestion, not distance"""
+        if state.weights_version == 0:
+            return state
+        cached = self._distance_state
+        if cached is None or cached.fingerprint != state.fingerprint:
+            # The hierarchy and trees were built on congested weights, so they are dropped
+            cached = replace(state, road=state.road.with_weights(state.base_weights),
+                             weights_version=0, ch=None, trees={})
+            self._distance_state = cached
+        return cached
+
+    def distances(self, pickups: Coordinates, dropoffs: Coordinates) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Trip distances in km and whether each one follows the road network.
+        Trips the graph cannot connect, or that start or end too far from it,
+        fall back to the straight-line distance.
+        """
+        pickup = np.asarray(pickups, dtype=np.float64).reshape(-1, 2)
+        dropoff = np.asarray(dropoffs, dtype=np.float64).reshape(-1, 2)
+        if len(pickup) != len(dropoff):
+            raise ValueError("pickups and dropoffs must have the same length")
+        straight = haversine_many(pickup[:, 0], pickup[:, 1], dropoff[:, 0], dropoff[:, 1])
+        if len(pickup) == 0:
+            return straight, np.zeros(0, dtype=bool)
+
+        state = self._free_flow(self.routing.state)
+        road = state.road
+        lat, lng = np.asarray(road.lat), np.asarray(road.lng)
+        source = np.asarray(state.node_index.nearest_many(pickup[:, 0], pickup[:, 1]), dtype=np.int64)
+        target = np.asarray(state.node_index.nearest_many(dropoff[:, 0], dropoff[:, 1]), dtype=np.int64)
+        # Straight-line legs between the trip's ends and the network
+        pickup_leg = haversine_many(pickup[:, 0], pickup[:, 1], lat[source], lng[source])
+        dropoff_leg = haversine_many(lat[target], lng[target], dropoff[:, 0], dropoff[:, 1])
+        covered = ((pickup_leg <= MAX_ACCESS_KM) & (dropoff_leg <= MAX_ACCESS_KM)
+                   & (pickup_leg <= straight) & (dropoff_leg <= straight))
+
+        # One code per unordered node pair; each distinct pair is looked up or routed once
+        codes = np.minimum(source, target) * road.node_count + np.maximum(source, target)
+        unique, inverse = np.unique(codes, return_inverse=True)
+        known = np.empty(len(unique), dtype=np.float64)
+        missing = []
+        with self._lock:
+            if self._memo_key != state.fingerprint:
+                self._memo.clear()
+                self._memo_key = state.fingerprint
+            for i, code in enumerate(unique.tolist()):
+                km = self._memo.get(code)
+                if km is None:
+                    missing.append(i)
+                else:
+                    self._memo.move_to_end(code)
+                    known[i] = km
+            self.hits += len(unique) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            pairs = [divmod(int(unique[i]), road.node_count) for i in missing]
+            routed = self.routing.node_distances(pairs, state)
+            known[missing] = routed
+            with self._lock:
+                if self._memo_key == state.fingerprint:
+                    self._memo.update(zip(unique[missing].tolist(), routed.tolist()))
+                    while len(self._memo) > self.memo_size:
+                        self._memo.popitem(last=False)
+
+        road_km = known[inverse] + pickup_leg + dropoff_leg
+        reachable = covered & np.isfinite(road_km)
+        # Never quote below the straight-line distance
+        return np.where(reachable, np.maximum(road_km, straight), straight), reachable
+
+    def quote(self, pickups: Coordinates, dropoffs: Coordinates,
+              passengers: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(fares in rupees, distances in km, road-distance flags) for every trip"""
+        km, reachable = self.distances(pickups, dropoffs)
+        passengers = np.asarray(passengers, dtype=np.float64)
+        if passengers.shape != km.shape:
+            raise ValueError("passengers must have one entry per trip")
+        fares = self.base_fare + km * self.per_km_rate + (passengers - 1) * self.per_person_charge
+        return np.round(fares, 2), km, reachable
@@ -0,0 +1,143 @@
+"""
+Precompiled binary routing graph with memory-mapped loading.
+
+campus_graph.json is compiled once into campus_graph.bin: node coordinates,
+the CSR adjacency with precomputed great-circle weights, node IDs and the
+built nearest-node KD-tree. Loading maps the file read-only and wraps each
+section in a typed memoryview, so startup does no JSON parsing or haversine
+work and every worker on a host shares the same page-cache pages.
+
+Layout (little-endian):
+    header   magic, format version, section count, source size/mtime/sha256
+    sections table of (name, typecode, byte offset, item count)
+    data     each section's raw array, 8-byte aligned
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+import mmap
+import os
+import struct
+import sys
+import numpy as np
+
+from app.services.road_graph import RoadGraph, graph_fingerprint
+from app.utils.geo_index import GeoKDTree
+
+MAGIC = b"RSGRAPH\0"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<8sIIQq32s")  # magic, version, sections, source size, source mtime_ns, source sha256
+SECTION = struct.Struct("<16s4sQQ")  # name, typecode, offset, count
+
+# RoadGraph arrays; node IDs and edge class names travel as NUL-separated UTF-8 blobs
+GRAPH_ARRAYS = {"lat": "d", "lng": "d", "offsets": "q", "targets": "i", "weights": "d", "edge_class": "B"}
+
+
+@dataclass
+class CompiledGraph:
+    road: RoadGraph
+    node_index: GeoKDTree
+    fingerprint: str  # sha256 of the JSON the graph was compiled from
+
+
+def _source_stamp(json_path: str) -> Tuple[int, int]:
+    stat = os.stat(json_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def compile_graph(json_path: str, bin_path: str, road: Optional[RoadGraph] = None,
+                  node_index: Optional[GeoKDTree] = None) -> CompiledGraph:
+    """Write bin_path from json_path (reusing an already built graph/tree if given)"""
+    size, mtime_ns = _source_stamp(json_path)
+    fingerprint = graph_fingerprint(json_path)
+    road = road or RoadGraph.from_json(json_path)
+    node_index = node_index or GeoKDTree(road.lat, road.lng)
+
+    if any('\0' in name for name in road.node_ids + road.class_names):
+        raise ValueError("Node IDs and edge classes must not contain NUL characters")
+    sections: Dict[str, Tuple[str, bytes]] = {
+        "ids": ("B", '\0'.join(road.node_ids).encode('utf-8')),
+        "class_names": ("B", '\0'.join(road.class_names).encode('utf-8')),
+    }
+    for name, code in GRAPH_ARRAYS.items():
+        sections[name] = (code, np.asarray(getattr(road, name), dtype=np.dtype(code)).tobytes())
+    for name, array in node_index.to_arrays().items():
+        sections["kd_" + name] = (GeoKDTree.ARRAYS[name], array.tobytes())
+
+    offset = HEADER.size + SECTION.size * len(sections)
+    table, blobs = [], []
+    for name, (code, blob) in sections.items():
+        offset += -offset % 8
+        table.append(SECTION.pack(name.encode(), code.encode(), offset, len(blob) // struct.calcsize(code)))
+        blobs.append((offset, blob))
+        offset += len(blob)
+
+    # Write to a private temp file and rename, so concurrent workers never see a partial file
+    tmp_path = f"{bin_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), size, mtime_ns, bytes.fromhex(fingerprint)))
+        f.write(b''.join(table))
+        for start, blob in blobs:
+            f.write(b'\0' * (start - f.tell()))
+            f.write(blob)
+    os.replace(tmp_path, bin_path)
+    return CompiledGraph(road, node_index, fingerprint)
+
+
+def load_compiled_graph(bin_path: str, json_path: Optional[str] = None) -> Optional[CompiledGraph]:
+    """
+    Memory-map bin_path; returns None if it is missing, from another format
+    version, or older than json_path (when that file exists).
+    """
+    if not os.path.exists(bin_path):
+        return None
+    with open(bin_path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, count, size, mtime_ns, digest = HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        mapped.close()
+        return None
+    fingerprint = digest.hex()
+    if json_path is not None and os.path.exists(json_path) and _source_stamp(json_path) != (size, mtime_ns):
+        # Touched but possibly unchanged: fall back to comparing content hashes
+        if graph_fingerprint(json_path) != fingerprint:
+            mapped.close()
+            return None
+
+    view = memoryview(mapped)
+    arrays = {}
+    for i in range(count):
+        name, code, offset, items = SECTION.unpack_from(mapped, HEADER.size + i * SECTION.size)
+        code = code.rstrip(b'\0').decode()
+        arrays[name.rstrip(b'\0').decode()] = view[offset:offset + items * struct.calcsize(code)].cast(code)
+
+    node_ids = bytes(arrays["ids"]).decode('utf-8').split('\0') if len(arrays["lat"]) else []
+    class_names = bytes(arrays["class_names"]).decode('utf-8').split('\0')
+    road = RoadGraph(node_ids, *(arrays[name] for name in GRAPH_ARRAYS), class_names=class_names)
+    node_index = GeoKDTree.from_arrays({name: arrays["kd_" + name] for name in GeoKDTree.ARRAYS})
+    return CompiledGraph(road, node_index, fingerprint)
+
+
+def load_or_compile(json_path: str, bin_path: str) -> CompiledGraph:
+    """Map the compiled graph if it is current, otherwise build from JSON and compile it for next time"""
+    compiled = load_compiled_graph(bin_path, json_path)
+    if compiled is not None:
+        return compiled
+    road = RoadGraph.from_json(json_path)
+    node_index = GeoKDTree(road.lat, road.lng)
+    try:
+        return compile_graph(json_path, bin_path, road, node_index)
+    except OSError as e:
+        # Read-only data directory: keep serving from the in-memory build
+        print(f"Could not write compiled graph {bin_path}: {e}")
+        return CompiledGraph(road, node_index, graph_fingerprint(json_path))
+
+
+if __name__ == "__main__":
+    # Build step: python -m app.services.graph_compiler [path/to/campus_graph.json]
+    default_json = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'campus_graph.json')
+    json_path = sys.argv[1] if len(sys.argv) > 1 else default_json
+    bin_path = os.path.splitext(json_path)[0] + '.bin'
+    compiled = compile_graph(json_path, bin_path)
+    print(f"Compiled {compiled.road.node_count} nodes / {compiled.road.edge_count} directed edges -> {bin_path}")
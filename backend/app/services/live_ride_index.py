@@ -0,0 +1,272 @@
+"""
+In-process index of active rides for /rides/nearby.
+
+Active (PENDING/ACCEPTED) rides are bucketed by pickup-time slot and then by
+a lat/lng grid cell, so a nearby query only looks at the slots inside its
+time window and the cells around its location; it never touches MongoDB.
+
+The index is loaded once and kept current from a change stream on the rides
+collection. Change streams need a replica set; on a standalone mongod the
+index falls back to polling for rides whose updated_at moved. Either way
+metrics() reports its size and how far behind the database it is.
+"""
+
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+from math import cos, floor, radians
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import time
+from pydantic import ValidationError
+from pymongo.errors import OperationFailure
+
+from app.models.ride_model import RideModel, RideStatus
+from app.dtos.ride_dto import NearbyRidesRequest
+from app.services.road_graph import haversine
+
+ACTIVE_STATUSES = (RideStatus.PENDING, RideStatus.ACCEPTED)
+KM_PER_DEGREE_LAT = 111.195
+EPOCH = datetime(1970, 1, 1)
+
+Cell = Tuple[int, int]
+# What a bucket keeps per ride: the fields a query filters on, then the ride itself
+Entry = Tuple[float, float, datetime, RideStatus, RideModel]
+
+
+class LiveRideIndex:
+    SLOT_MINUTES = 15
+    CELL_DEGREES = 0.01  # about 1.1 km of latitude
+    # Polled windows overlap so writes committed just after a poll are not missed
+    POLL_OVERLAP = timedelta(seconds=5)
+    RETRY_SECONDS = 5.0
+
+    def __init__(self, poll_interval: float = 2.0):
+        self.poll_interval = poll_interval
+        self.slots: Dict[int, Dict[Cell, Dict[str, Entry]]] = {}
+        self.where: Dict[str, Tuple[int, Cell]] = {}  # ride id -> (slot, cell)
+        self.ready = False
+        self.mode = "stopped"  # "change_stream", "polling", "stopped" or "failed"
+        self.lag_seconds: Optional[float] = None
+        self.last_sync: Optional[float] = None  # time.time() of the last applied event or poll
+        self.events = 0
+        self.queries = 0
+        self.errors = 0
+        self.invalid = 0  # active ride documents skipped because they do not parse
+        self.last_error: Optional[str] = None
+        self._watermark: Optional[datetime] = None
+        self._pruned_slot = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _slot(self, when: datetime) -> int:
+        # Stored times are naive UTC, like datetime.utcnow()
+        return int((when - EPOCH).total_seconds() // (self.SLOT_MINUTES * 60))
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return floor(lat / self.CELL_DEGREES), floor(lng / self.CELL_DEGREES)
+
+    def _remove(self, ride_id: str) -> None:
+        place = self.where.pop(ride_id, None)
+        if place is None:
+            return
+        slot, cell = place
+        cells = self.slots[slot]
+        bucket = cells[cell]
+        del bucket[ride_id]
+        if not bucket:
+            del cells[cell]
+            if not cells:
+                del self.slots[slot]
+
+    def apply(self, doc: dict) -> None:
+        """Bring the index in line with one stored ride document"""
+        ride_id = str(doc.get("id", doc.get("_id")))
+        self._remove(ride_id)
+        if doc.get("status") not in ACTIVE_STATUSES:
+            return
+        try:
+            ride = RideModel(**doc)
+        except ValidationError:
+            # e.g. coordinates stored before they were bounded; such rides are not searchable anyway
+            self.invalid += 1
+            return
+        if ride.pickup_time.tzinfo is not None:
+            ride.pickup_time = ride.pickup_time.astimezone(timezone.utc).replace(tzinfo=None)
+        slot = self._slot(ride.pickup_time)
+        if slot < self._pruned_slot:
+            return
+        lat, lng = ride.pickup_location.latitude, ride.pickup_location.longitude
+        cell = self._cell(lat, lng)
+        self.slots.setdefault(slot, {}).setdefault(cell, {})[ride_id] = (lat, lng, ride.pickup_time, ride.status, ride)
+        self.where[ride_id] = (slot, cell)
+
+    def _prune(self, now: datetime) -> None:
+        """Drop slots whose pickup times have all passed"""
+        current = self._slot(now)
+        if current <= self._pruned_slot:
+            return
+        for slot in [s for s in self.slots if s < current]:
+            for bucket in self.slots.pop(slot).values():
+                for ride_id in bucket:
+                    del self.where[ride_id]
+        self._pruned_slot = current
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def can_answer(self, request: NearbyRidesRequest) -> bool:
+        return self.ready and all(s in ACTIVE_STATUSES for s in (request.status or ()))
+
+    def nearby(self, request: NearbyRidesRequest) -> Tuple[List[RideModel], bool]:
+        """Same contract as RideService.find_nearby_rides, answered from memory"""
+        self.queries += 1
+        now = datetime.utcnow()
+        self._prune(now)
+        end = now + timedelta(minutes=request.time_window)
+        statuses = set(request.status or (RideStatus.PENDING,))
+        lat, lng = request.current_location.latitude, request.current_location.longitude
+        # Cells overlapping the bounding box of the search circle
+        dlat = request.max_distance / KM_PER_DEGREE_LAT
+        dlng = dlat / max(cos(radians(lat)), 1e-6)
+        lo_r, lo_c = self._cell(lat - dlat, lng - dlng)
+        hi_r, hi_c = self._cell(lat + dlat, lng + dlng)
+        box_cells = (hi_r - lo_r + 1) * (hi_c - lo_c + 1)
+
+        found = []
+        for slot in range(self._slot(now), self._slot(end) + 1):
+            cells = self.slots.get(slot)
+            if not cells:
+                continue
+            if box_cells <= len(cells):
+                buckets = [cells[c] for c in ((r, c) for r in range(lo_r, hi_r + 1)
+                                              for c in range(lo_c, hi_c + 1)) if c in cells]
+            else:
+                buckets = [b for (r, c), b in cells.items() if lo_r <= r <= hi_r and lo_c <= c <= hi_c]
+            for bucket in buckets:
+                for ride_id, (ride_lat, ride_lng, pickup_time, status, ride) in bucket.items():
+                    if status not in statuses or not now <= pickup_time <= end:
+                        continue
+                    d = haversine(lat, lng, ride_lat, ride_lng)
+                    if d <= request.max_distance:
+                        found.append((d, ride_id, ride))
+        found.sort(key=lambda item: (item[0], item[1]))
+        page = found[request.skip:request.skip + request.limit]
+        rides = [ride.model_copy(update={"distance_km": d}) for d, _, ride in page]
+        return rides, len(found) > request.skip + request.limit
+
+    def metrics(self) -> dict:
+        return {
+            "mode": self.mode,
+            "ready": self.ready,
+            "rides": len(self.where),
+            "slots": len(self.slots),
+            "buckets": sum(len(cells) for cells in self.slots.values()),
+            "lag_seconds": self.lag_seconds,
+            "seconds_since_sync": None if self.last_sync is None else time.time() - self.last_sync,
+            "events_applied": self.events,
+            "queries": self.queries,
+            "errors": self.errors,
+            "invalid_rides": self.invalid,
+            "last_error": self.last_error,
+        }
+
+    async def load(self, collection) -> None:
+        """Rebuild the index from every active ride that has not been picked up yet"""
+        # Queries go to the database until the index is complete again
+        self.ready = False
+        now = datetime.utcnow()
+        self._watermark = now - self.POLL_OVERLAP
+        self.slots, self.where = {}, {}
+        self._pruned_slot = self._slot(now)
+        query = {"status": {"$in": list(ACTIVE_STATUSES)}, "pickup_time": {"$gte": now}}
+        async for doc in collection.find(query):
+            self.apply(doc)
+        self.ready = True
+        self.last_sync = time.time()
+
+    def start(self, collection) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(collection))
+            self._task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        # run() only ends by cancellation; anything else means the index is no longer kept current
+        if task.cancelled() or task.exception() is None:
+            return
+        print(f"Live ride index stopped following the rides collection: {task.exception()!r}")
+        self.ready = False
+        self.mode = "failed"
+        self.last_error = repr(task.exception())
+
+    async def stop(self) -> None:
+        """Cancel the sync task; raises whatever killed it if it had already died"""
+        task, self._task = self._task, None
+        self.mode = "stopped"
+        self.ready = False
+        if task is None:
+            return
+        if task.done():
+            task.result()
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def run(self, collection) -> None:
+        """Follow the collection until cancelled, resyncing from scratch after errors"""
+        while True:
+            try:
+                try:
+                    async with collection.watch(full_document="updateLookup") as stream:
+                        # Stream opened before loading, so no write falls between the two
+                        await self.load(collection)
+                        self.mode = "change_stream"
+                        async for change in stream:
+                            self._apply_change(change)
+                except OperationFailure:
+                    # Standalone mongod: change streams are not available
+                    await self.load(collection)
+                    self.mode = "polling"
+                    await self._poll(collection)
+            except Exception as e:
+                # Database errors, but also a document apply() cannot parse: either way the index
+                # may have missed writes, so queries go to the database until a full reload
+                print(f"Live ride index lost sync, retrying: {e!r}")
+                self.ready = False
+                self.mode = "stopped"
+                self.errors += 1
+                self.last_error = repr(e)
+                await asyncio.sleep(self.RETRY_SECONDS)
+
+    def _apply_change(self, change: dict) -> None:
+        operation = change.get("operationType")
+        if operation in ("insert", "update", "replace"):
+            doc = change.get("fullDocument")
+            if doc is None:  # deleted again before the lookup
+                self._remove(str(change["documentKey"]["_id"]))
+            else:
+                self.apply(doc)
+        elif operation == "delete":
+            self._remove(str(change["documentKey"]["_id"]))
+        else:
+            return
+        self.events += 1
+        self.last_sync = time.time()
+        cluster_time = change.get("clusterTime")
+        if cluster_time is not None:
+            self.lag_seconds = max(0.0, self.last_sync - cluster_time.time)
+        self._prune(datetime.utcnow())
+
+    async def _poll(self, collection) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            polled_at = datetime.utcnow()
+            async for doc in collection.find({"updated_at": {"$gte": self._watermark}}):
+                self.apply(doc)
+                self.events += 1
+            self._watermark = polled_at - self.POLL_OVERLAP
+            self.last_sync = time.time()
+            # Anything written since the poll started may not be visible yet
+            self.lag_seconds = (datetime.utcnow() - polled_at).total_seconds() + self.poll_interval
+            self._prune(polled_at)
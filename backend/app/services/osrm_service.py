@@ -0,0 +1,130 @@
+"""
+OSRM driving-route client with connection pooling and a response cache.
+
+One httpx.AsyncClient is kept for the life of the process, so requests
+reuse keep-alive connections instead of paying a TCP+TLS handshake each
+time, and a semaphore bounds how many requests are in flight. Coordinates
+are snapped to a fixed decimal grid (4 decimals is about 11 m) before the
+request, and the snapped pair keys an LRU cache with a TTL, so repeated
+routes from the same hostel are answered from memory. Concurrent requests
+for the same key share one upstream call.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import asyncio
+import time
+import httpx
+
+CacheKey = Tuple[float, float, float, float]
+
+
+class OSRMService:
+    def __init__(self, base_url: str, timeout: float = 10.0, max_connections: int = 20,
+                 cache_size: int = 1024, cache_ttl: float = 3600.0, snap_decimals: int = 4,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.snap_decimals = snap_decimals
+        # Custom transport (e.g. httpx.MockTransport or httpx.ASGITransport) for a local stand-in
+        self.transport = transport
+        self.client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cache: "OrderedDict[CacheKey, Tuple[float, Optional[dict]]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self.client is None:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self.client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                            limits=limits, transport=self.transport)
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+        return self.client
+
+    async def aclose(self) -> None:
+        """Close pooled connections (call on application shutdown)"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def snap(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float) -> CacheKey:
+        d = self.snap_decimals
+        return round(start_lat, d), round(start_lng, d), round(end_lat, d), round(end_lng, d)
+
+    def _cached(self, key: CacheKey) -> Tuple[bool, Optional[dict]]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return False, None
+        expires, route = entry
+        if expires < time.monotonic():
+            del self._cache[key]
+            return False, None
+        self._cache.move_to_end(key)
+        return True, route
+
+    def _store(self, key: CacheKey, route: Optional[dict]) -> None:
+        self._cache[key] = (time.monotonic() + self.cache_ttl, route)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def route(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float) -> Optional[dict]:
+        """
+        Driving route between two points as {"distance_km", "path": [[lat, lng], ...]}.
+
+        Returns None when OSRM finds no route; raises httpx errors on transport
+        or HTTP failures (those are not cached).
+        """
+        key = self.snap(start_lat, start_lng, end_lat, end_lng)
+        found, route = self._cached(key)
+        if found:
+            self.hits += 1
+            return route
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            route = await self._fetch(*key)
+            self._store(key, route)
+            future.set_result(route)
+            return route
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so failures nobody else awaited are not logged as unhandled
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _fetch(self, start_lat: float, start_lng: float, end_lat: float, end_lng: float) -> Optional[dict]:
+        client = self._get_client()
+        coords = f"{start_lng},{start_lat};{end_lng},{end_lat}"
+        params = {"overview": "full", "geometries": "geojson"}
+        async with self._semaphore:
+            resp = await client.get(f"/route/v1/driving/{coords}", params=params)
+        resp.raise_for_status()
+        data = resp.json()
+        if not data.get("routes"):
+            return None
+        route = data["routes"][0]
+        coords_lnglat = route["geometry"]["coordinates"]  # [[lng,lat], ...]
+        return {
+            "distance_km": route.get("distance", 0) / 1000.0,
+            "path": [[lat, lng] for lng, lat in coords_lnglat]
+        }
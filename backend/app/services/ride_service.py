@@ -1,12 +1,123 @@
 from datetime import datetime, timedelta
-from typing import List
+from bson import ObjectId
+from typing import AsyncIterator, List, Optional, Tuple
 from math import radians, sin, cos, sqrt, atan2
-from ..models.ride_model import RideModel, Location, RideStatus
-from ..dtos.ride_dto import NearbyRidesRequest, CreateRideRequest, UpdateRideRequest
+import base64
+import binascii
+import json
+from fastapi.concurrency import run_in_threadpool
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from ..models.ride_model import RideModel, Location, RideStatus, statuses_leading_to
+from .fare_quote_service import BASE_FARE, PER_KM_RATE, PER_PERSON_CHARGE
+from ..dtos.ride_dto import NearbyRidesRequest, CreateRideRequest, UpdateRideRequest, RecurringRideRequest
+
+# Compound index behind find_nearby_rides: pickup point first so $geoNear can use it
+NEARBY_INDEX = [("pickup_point", GEOSPHERE), ("status", ASCENDING), ("pickup_time", ASCENDING)]
+
+# Most rides one recurring schedule may book (a semester of weekday commutes is about 100)
+MAX_SCHEDULED_RIDES = 200
+# Longest date range a schedule may span, checked before any day is walked
+MAX_SCHEDULE_DAYS = 366
+
+# Keyset pagination of a user's rides, newest first
+USER_RIDES_INDEX = [("passenger_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+USER_RIDES_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+# Rides changed since a time: the live ride index polls on this when change streams are unavailable
+UPDATED_AT_INDEX = [("updated_at", ASCENDING)]
+# Rides re-keyed per batch when migrating documents stored with an ObjectId _id
+LEGACY_ID_BATCH = 500
+# Stored-only fields left out of ride listings
+RIDE_PROJECTION = {"_id": False, "pickup_point": False}
+
+
+def encode_cursor(ride: RideModel) -> str:
+    """Opaque page token: the sort key of the last ride on a page"""
+    raw = json.dumps([ride.created_at.isoformat(), ride.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, ride_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created_at), str(ride_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def geo_point(location: Location) -> dict:
+    """GeoJSON point for a location (GeoJSON orders coordinates longitude first)"""
+    return {"type": "Point", "coordinates": [location.longitude, location.latitude]}
+
+
+def ride_document(ride: RideModel) -> dict:
+    """Stored form of a ride: keyed by its id, with a GeoJSON pickup point for geo queries"""
+    doc = ride.model_dump()
+    doc["_id"] = ride.id
+    doc["pickup_point"] = geo_point(ride.pickup_location)
+    return doc
+
 
 class RideService:
-    def __init__(self, db_collection):
+    def __init__(self, db_collection, live_index=None, fare_engine=None):
         self.rides = db_collection
+        # Optional LiveRideIndex answering nearby queries from memory
+        self.live_index = live_index
+        # Optional FareQuoteEngine pricing fares on road distances
+        self.fare_engine = fare_engine
+
+    async def ensure_indexes(self) -> None:
+        """Create the query indexes (idempotent), re-key older rides and give them their GeoJSON pickup point"""
+        migrated = await self.migrate_legacy_ids()
+        if migrated:
+            print(f"Re-keyed {migrated} rides stored with an ObjectId _id")
+        valid = {"pickup_location.latitude": {"$gte": -90, "$lte": 90},
+                 "pickup_location.longitude": {"$gte": -180, "$lte": 180}}
+        await self.rides.update_many(
+            {"pickup_point": {"$exists": False}, **valid},
+            [{"$set": {"pickup_point": {"type": "Point", "coordinates": [
+                "$pickup_location.longitude", "$pickup_location.latitude"]}}}]
+        )
+        # Left without a point (a 2dsphere index would reject it), so nearby queries never return them
+        invalid = await self.rides.count_documents({"pickup_point": {"$exists": False}})
+        if invalid:
+            print(f"{invalid} rides have no valid pickup coordinates and are left out of nearby search")
+        await self.rides.create_index(NEARBY_INDEX, name="pickup_point_status_pickup_time")
+        await self.rides.create_index(USER_RIDES_INDEX, name="passenger_id_created_at_id")
+        await self.rides.create_index(UPDATED_AT_INDEX, name="updated_at")
+
+    async def migrate_legacy_ids(self) -> int:
+        """
+        Rides stored before _id was the ride's id have an ObjectId _id and the
+        id clients know in the id field, so lookups by id never found them.
+        _id cannot be changed in place: each is copied under _id = id and the
+        original deleted. Safe to rerun after an interruption.
+        """
+        migrated = 0
+        batch: List[dict] = []
+        async for doc in self.rides.find({"_id": {"$type": "objectId"}}):
+            batch.append(doc)
+            if len(batch) == LEGACY_ID_BATCH:
+                migrated += await self._rekey(batch)
+                batch = []
+        if batch:
+            migrated += await self._rekey(batch)
+        return migrated
+
+    async def _rekey(self, docs: List[dict]) -> int:
+        old_ids = [doc["_id"] for doc in docs]
+        copies = []
+        for doc in docs:
+            ride_id = str(doc.get("id") or doc["_id"])
+            copies.append({**doc, "_id": ride_id, "id": ride_id})
+        try:
+            await self.rides.insert_many(copies, ordered=False)
+        except BulkWriteError as e:
+            # Copies left by an interrupted earlier run already exist; anything else is a real failure
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        await self.rides.delete_many({"_id": {"$in": old_ids}})
+        return len(docs)
 
     def calculate_distance(self, loc1: Location, loc2: Location) -> float:
         """Calculate distance between two points using Haversine formula."""
@@ -24,8 +135,18 @@ class RideService:
 
         return distance
 
-    async def find_nearby_rides(self, request: NearbyRidesRequest) -> List[RideModel]:
-        """Find ride requests within specified distance and time window."""
+    async def find_nearby_rides(self, request: NearbyRidesRequest) -> Tuple[List[RideModel], bool]:
+        """
+        Find ride requests within specified distance and time window, nearest first.
+
+        The database does the filtering, distance sort and paging ($geoNear on
+        the pickup_point index). Returns (rides on this page, whether more follow);
+        each ride carries distance_km from the requested location. With a ready
+        live index and only active statuses requested, answers from memory instead.
+        """
+        if self.live_index is not None and self.live_index.can_answer(request):
+            return self.live_index.nearby(request)
+
         current_time = datetime.utcnow()
         time_threshold = current_time + timedelta(minutes=request.time_window)
         
@@ -35,21 +156,23 @@ class RideService:
             "pickup_time": {"$gte": current_time, "$lte": time_threshold}
         }
 
-        # Get all potential rides within the time window
-        rides = await self.rides.find(base_query).to_list(length=100)
-        
-        # Filter by distance and sort by proximity
-        nearby_rides = []
-        for ride in rides:
-            distance = self.calculate_distance(request.current_location, ride.pickup_location)
-            if distance <= request.max_distance:
-                ride.distance_to_pickup = distance  # Add distance info for sorting
-                nearby_rides.append(ride)
-        
-        # Sort by distance
-        nearby_rides.sort(key=lambda x: x.distance_to_pickup)
-        
-        return nearby_rides
+        pipeline = [
+            {"$geoNear": {
+                "near": geo_point(request.current_location),
+                "key": "pickup_point",
+                "spherical": True,
+                "maxDistance": request.max_distance * 1000,  # metres
+                "query": base_query,
+                "distanceField": "distance_km",
+                "distanceMultiplier": 0.001,
+            }},
+            {"$skip": request.skip},
+            # One extra document tells us whether there is another page
+            {"$limit": request.limit + 1},
+        ]
+        docs = await self.rides.aggregate(pipeline).to_list(length=request.limit + 1)
+        rides = [RideModel(**doc) for doc in docs[:request.limit]]
+        return rides, len(docs) > request.limit
 
     async def create_ride(self, request: CreateRideRequest, passenger_id: str) -> RideModel:
         """Create a new ride request."""
@@ -60,79 +183,194 @@ class RideService:
             pickup_time=request.pickup_time,
             number_of_passengers=request.number_of_passengers,
             special_requirements=request.special_requirements,
-            estimated_fare=self.calculate_estimated_fare(
+            estimated_fare=await self.estimate_fare(
                 request.pickup_location,
                 request.dropoff_location,
                 request.number_of_passengers
             )
         )
         
-        await self.rides.insert_one(ride.model_dump())
+        await self.rides.insert_one(ride_document(ride))
         return ride
 
+    def schedule_pickup_times(self, request: RecurringRideRequest) -> List[datetime]:
+        """Future pickup times (naive UTC) for every matching weekday between the schedule's dates"""
+        if request.end_date < request.start_date:
+            raise ValueError("end_date must not be before start_date")
+        if (request.end_date - request.start_date).days >= MAX_SCHEDULE_DAYS:
+            raise ValueError(f"A schedule may span at most {MAX_SCHEDULE_DAYS} days")
+        offset = timedelta(minutes=request.utc_offset_minutes)
+        now = datetime.utcnow()
+        times = []
+        day = request.start_date
+        while day <= request.end_date:
+            if day.weekday() in request.weekdays:
+                pickup_time = datetime.combine(day, request.pickup_time) - offset
+                if pickup_time > now:
+                    times.append(pickup_time)
+                    if len(times) > MAX_SCHEDULED_RIDES:
+                        raise ValueError(f"A schedule may book at most {MAX_SCHEDULED_RIDES} rides")
+            day += timedelta(days=1)
+        if not times:
+            raise ValueError("Schedule has no future pickup times")
+        return times
+
+    async def create_recurring_rides(self, request: RecurringRideRequest,
+                                     passenger_id: str) -> Tuple[str, List[RideModel]]:
+        """Expand a weekly schedule into rides and store them with a single insert_many."""
+        pickup_times = self.schedule_pickup_times(request)
+        schedule_id = str(ObjectId())
+        # Every ride of a schedule has the same route and party size, so one fare covers them all
+        fare = await self.estimate_fare(
+            request.pickup_location,
+            request.dropoff_location,
+            request.number_of_passengers
+        )
+        rides = [
+            RideModel(
+                passenger_id=passenger_id,
+                pickup_location=request.pickup_location,
+                dropoff_location=request.dropoff_location,
+                pickup_time=pickup_time,
+                number_of_passengers=request.number_of_passengers,
+                special_requirements=request.special_requirements,
+                estimated_fare=fare,
+                schedule_id=schedule_id
+            )
+            for pickup_time in pickup_times
+        ]
+        await self.rides.insert_many([ride_document(ride) for ride in rides], ordered=False)
+        return schedule_id, rides
+
+    async def estimate_fare(self, pickup: Location, dropoff: Location, passengers: int) -> float:
+        """calculate_estimated_fare for async callers; routing runs in the threadpool, off the event loop."""
+        if self.fare_engine is None:
+            return self.calculate_estimated_fare(pickup, dropoff, passengers)
+        return await run_in_threadpool(self.calculate_estimated_fare, pickup, dropoff, passengers)
+
     def calculate_estimated_fare(self, pickup: Location, dropoff: Location, passengers: int) -> float:
-        """Calculate estimated fare based on distance and passengers."""
-        base_fare = 50  # Base fare in rupees
-        per_km_rate = 12  # Rate per kilometer
-        per_person_charge = 10  # Additional charge per passenger
+        """Calculate estimated fare based on distance (by road when a fare engine is set) and passengers."""
+        if self.fare_engine is not None:
+            fares, _, _ = self.fare_engine.quote([(pickup.latitude, pickup.longitude)],
+                                                 [(dropoff.latitude, dropoff.longitude)], [passengers])
+            return float(fares[0])
 
         distance = self.calculate_distance(pickup, dropoff)
-        fare = base_fare + (distance * per_km_rate) + ((passengers - 1) * per_person_charge)
+        fare = BASE_FARE + (distance * PER_KM_RATE) + ((passengers - 1) * PER_PERSON_CHARGE)
         
         return round(fare, 2)
 
-    async def update_ride(self, ride_id: str, update: UpdateRideRequest) -> RideModel:
-        """Update ride details."""
+    async def update_ride(self, ride_id: str, user_id: str, update: UpdateRideRequest) -> RideModel:
+        """
+        Update one of the user's rides. Ownership and, when the status changes,
+        the transition (RIDE_STATUS_TRANSITIONS) are checked in the same atomic
+        write. Raises LookupError when the user has no such ride and ValueError
+        when the status move is not allowed.
+        """
         update_data = update.model_dump(exclude_unset=True)
         update_data["updated_at"] = datetime.utcnow()
 
-        result = await self.rides.update_one(
-            {"_id": ride_id},
-            {"$set": update_data}
+        query = {"_id": ride_id, "passenger_id": user_id}
+        new_status = update_data.get("status")
+        if new_status is not None:
+            query["status"] = {"$in": statuses_leading_to(new_status)}
+        updated_ride = await self.rides.find_one_and_update(
+            query,
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
+        if updated_ride is not None:
+            return RideModel(**updated_ride)
 
-        if result.modified_count == 0:
-            raise ValueError("Ride not found or no changes made")
+        # Nothing matched: look the ride up only to report why
+        ride = await self.rides.find_one({"_id": ride_id}, {"passenger_id": True, "status": True})
+        if not ride or ride["passenger_id"] != user_id:
+            raise LookupError("Ride not found")
+        raise ValueError(f"Cannot move ride from {RideStatus(ride['status']).value} to {RideStatus(new_status).value}")
 
-        updated_ride = await self.rides.find_one({"_id": ride_id})
-        return RideModel(**updated_ride)
+    async def update_statuses(self, updates: List[Tuple[str, RideStatus]], user_id: str) -> List[str]:
+        """
+        Move many of the user's rides to new statuses in one unordered bulk
+        write. Each ride only changes if the user booked it and the move is
+        allowed from its current status (see RIDE_STATUS_TRANSITIONS). Returns
+        the ids of rides that were not updated.
+        """
+        # Millisecond precision, as stored, so the write can be recognised afterwards
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        operations = [
+            UpdateOne({"_id": ride_id, "passenger_id": user_id, "status": {"$in": statuses_leading_to(status)}},
+                      {"$set": {"status": status, "updated_at": now}})
+            for ride_id, status in updates
+        ]
+        result = await self.rides.bulk_write(operations, ordered=False)
+        if result.modified_count == len(updates):
+            return []
+        # Only on partial success: find out which rides did not move
+        wanted = dict(updates)
+        moved = self.rides.find({"_id": {"$in": list(wanted)}, "passenger_id": user_id, "updated_at": now},
+                                {"_id": True, "status": True})
+        done = {doc["_id"] async for doc in moved if doc["status"] == wanted[doc["_id"]]}
+        return [ride_id for ride_id, _ in updates if ride_id not in done]
 
-    async def get_user_rides(self, user_id: str, status: List[RideStatus] = None) -> List[RideModel]:
-        """Get all rides for a specific user with optional status filtering."""
+    def _user_rides_query(self, user_id: str, status: Optional[List[RideStatus]] = None,
+                          cursor: Optional[str] = None) -> dict:
         query = {"passenger_id": user_id}
         if status:
             query["status"] = {"$in": status}
+        if cursor:
+            created_at, ride_id = decode_cursor(cursor)
+            # Strictly after the cursor in (created_at, _id) descending order
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": ride_id}},
+            ]
+        return query
+
+    async def get_user_rides(self, user_id: str, status: List[RideStatus] = None, limit: int = 100,
+                             cursor: Optional[str] = None) -> Tuple[List[RideModel], Optional[str]]:
+        """
+        One page of a user's rides, newest first, with optional status filtering.
+        Returns (rides, cursor for the next page or None on the last page).
+        """
+        query = self._user_rides_query(user_id, status, cursor)
+        docs = await self.rides.find(query).sort(USER_RIDES_SORT).limit(limit + 1).to_list(length=limit + 1)
+        rides = [RideModel(**ride) for ride in docs[:limit]]
+        return rides, encode_cursor(rides[-1]) if len(docs) > limit else None
 
-        rides = await self.rides.find(query).to_list(length=100)
-        return [RideModel(**ride) for ride in rides]
+    def iter_user_rides(self, user_id: str, status: List[RideStatus] = None,
+                        cursor: Optional[str] = None, batch_size: int = 500) -> AsyncIterator[dict]:
+        """
+        Every ride of a user as stored documents, newest first: the database
+        cursor itself, so only one batch is held in memory at a time.
+        """
+        query = self._user_rides_query(user_id, status, cursor)
+        return self.rides.find(query, RIDE_PROJECTION).sort(USER_RIDES_SORT).batch_size(batch_size)
 
     async def cancel_ride(self, ride_id: str, user_id: str) -> RideModel:
         """Cancel a ride request."""
-        ride = await self.rides.find_one({"_id": ride_id})
-        if not ride:
-            raise ValueError("Ride not found")
-        
-        if ride["passenger_id"] != user_id:
-            raise ValueError("Not authorized to cancel this ride")
-
-        if ride["status"] not in [RideStatus.PENDING, RideStatus.ACCEPTED]:
-            raise ValueError(f"Cannot cancel ride in {ride['status']} status")
-
         update_data = {
             "status": RideStatus.CANCELLED,
             "updated_at": datetime.utcnow()
         }
 
-        result = await self.rides.update_one(
-            {"_id": ride_id},
-            {"$set": update_data}
+        # Ownership and status are checked in the same atomic write
+        cancelled_ride = await self.rides.find_one_and_update(
+            {"_id": ride_id, "passenger_id": user_id,
+             "status": {"$in": statuses_leading_to(RideStatus.CANCELLED)}},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
+        if cancelled_ride is not None:
+            return RideModel(**cancelled_ride)
 
-        if result.modified_count == 0:
-            raise ValueError("Failed to cancel ride")
-
-        cancelled_ride = await self.rides.find_one({"_id": ride_id})
-        return RideModel(**cancelled_ride)
+        # Nothing matched: look the ride up only to report why
+        ride = await self.rides.find_one({"_id": ride_id}, {"passenger_id": True, "status": True})
+        if not ride:
+            raise ValueError("Ride not found")
+        if ride["passenger_id"] != user_id:
+            raise ValueError("Not authorized to cancel this ride")
+        raise ValueError(f"Cannot cancel ride in {ride['status']} status")
 
     async def get_ride_by_id(self, ride_id: str, user_id: str) -> RideModel:
         """Get detailed information about a specific ride."""
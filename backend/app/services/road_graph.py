@@ -0,0 +1,145 @@
+"""
+Compact road graph in compressed sparse row (CSR) form.
+
+Nodes are integer indices 0..n-1; string IDs are only mapped to indices at
+the API boundary. The outgoing edges of node u are the slots
+offsets[u]..offsets[u+1]-1 of the parallel targets/weights arrays, and node
+coordinates live in lat/lng float arrays. The arrays are stdlib
+array.array (or memoryviews over the same layout), which keeps a directed
+edge at 12 bytes and still gives fast element access from pure-Python
+search loops.
+"""
+
+from __future__ import annotations
+from array import array
+import copy
+from typing import Dict, List, Optional, Sequence
+from math import radians, sin, cos, sqrt, atan2
+import hashlib
+import json
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Class of roads whose JSON edge has no "class" (see travel_profiles)
+DEFAULT_EDGE_CLASS = "road"
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in km between two degree coordinates"""
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lng1, lat2, lng2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    h = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+    c = 2 * atan2(sqrt(h), sqrt(1 - h))
+    return EARTH_RADIUS_KM * c
+
+
+def graph_fingerprint(path: str) -> str:
+    """SHA-256 of a graph file, used to detect stale preprocessing output"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def to_array(typecode: str, values: np.ndarray) -> array:
+    """Copy a NumPy array into a stdlib array of the given typecode"""
+    out = array(typecode)
+    out.frombytes(np.ascontiguousarray(values, dtype=np.dtype(typecode)).tobytes())
+    return out
+
+
+class RoadGraph:
+    def __init__(self, node_ids: List[str], lat: Sequence[float], lng: Sequence[float],
+                 offsets: Sequence[int], targets: Sequence[int], weights: Sequence[float],
+                 edge_class: Optional[Sequence[int]] = None, class_names: Optional[List[str]] = None):
+        self.node_ids = node_ids
+        self.index: Dict[str, int] = {nid: i for i, nid in enumerate(node_ids)}
+        self.lat = lat
+        self.lng = lng
+        self.offsets = offsets  # len n + 1
+        self.targets = targets  # len m, node index per directed edge
+        self.weights = weights  # len m, km per directed edge
+        # len m, index into class_names per directed edge (one byte each)
+        self.edge_class = edge_class if edge_class is not None else array('B', bytes(len(targets)))
+        self.class_names = class_names or [DEFAULT_EDGE_CLASS]
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        """Number of directed edges (each road appears once per direction)"""
+        return len(self.targets)
+
+    def neighbours(self, u: int) -> Dict[int, float]:
+        """Adjacency of u as a dict; convenient off the hot path"""
+        return {self.targets[e]: self.weights[e] for e in range(self.offsets[u], self.offsets[u + 1])}
+
+    def edge_slot(self, u: int, v: int) -> int:
+        """Slot of the directed edge u -> v, or -1 if absent"""
+        targets = self.targets
+        for e in range(self.offsets[u], self.offsets[u + 1]):
+            if targets[e] == v:
+                return e
+        return -1
+
+    def distance_km(self, u: int, v: int) -> float:
+        """Great-circle distance between two nodes"""
+        return haversine(self.lat[u], self.lng[u], self.lat[v], self.lng[v])
+
+    def with_weights(self, weights: Sequence[float]) -> "RoadGraph":
+        """Same graph with another weights array; structure and ID index are shared, not copied"""
+        graph = copy.copy(self)
+        graph.weights = weights
+        return graph
+
+    def nbytes(self) -> int:
+        """Bytes held by the coordinate and adjacency arrays"""
+        arrays = (self.lat, self.lng, self.offsets, self.targets, self.weights, self.edge_class)
+        return sum(memoryview(a).nbytes for a in arrays)
+
+    @classmethod
+    def from_json(cls, path: str) -> "RoadGraph":
+        """Build from campus_graph.json; edges are undirected and weighted by great-circle km"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        node_ids = [n['id'] for n in data['nodes']]
+        index = {nid: i for i, nid in enumerate(node_ids)}
+        lat = np.array([n['lat'] for n in data['nodes']], dtype=np.float64)
+        lng = np.array([n['lng'] for n in data['nodes']], dtype=np.float64)
+        src = np.array([index[e['from']] for e in data['edges']], dtype=np.int64)
+        dst = np.array([index[e['to']] for e in data['edges']], dtype=np.int64)
+        # Optional road class per edge ("arterial", "residential", ...) selecting its travel-time profile
+        class_names = list(dict.fromkeys(e.get('class', DEFAULT_EDGE_CLASS) for e in data['edges'])) or [DEFAULT_EDGE_CLASS]
+        class_index = {name: i for i, name in enumerate(class_names)}
+        classes = np.array([class_index[e.get('class', DEFAULT_EDGE_CLASS)] for e in data['edges']], dtype=np.uint8)
+        return cls.from_edges(node_ids, lat, lng, src, dst, classes, class_names)
+
+    @classmethod
+    def from_edges(cls, node_ids: List[str], lat: np.ndarray, lng: np.ndarray, src: np.ndarray, dst: np.ndarray,
+                   classes: Optional[np.ndarray] = None, class_names: Optional[List[str]] = None) -> "RoadGraph":
+        """CSR from undirected edge endpoint arrays; duplicate edges collapse into one (first class wins)"""
+        n = len(node_ids)
+        if len(class_names or []) > 256:
+            raise ValueError("At most 256 edge classes are supported")
+        if classes is None:
+            classes = np.zeros(len(src), dtype=np.uint8)
+        both_src = np.concatenate([src, dst])
+        both_dst = np.concatenate([dst, src])
+        keys, first = np.unique(both_src * max(n, 1) + both_dst, return_index=True)
+        both_src, both_dst = keys // max(n, 1), keys % max(n, 1)
+        both_classes = np.concatenate([classes, classes])[first]
+
+        lat1, lng1 = np.radians(lat[both_src]), np.radians(lng[both_src])
+        lat2, lng2 = np.radians(lat[both_dst]), np.radians(lng[both_dst])
+        h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+        weights = EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(both_src, minlength=n), out=offsets[1:])
+        return cls(node_ids, to_array('d', lat), to_array('d', lng), to_array('q', offsets),
+                   to_array('i', both_dst), to_array('d', weights), to_array('B', both_classes), class_names)
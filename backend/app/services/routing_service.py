@@ -1,12 +1,30 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Dict, List, Tuple, Optional
+from array import array
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterator, List, Sequence, Tuple, Optional
 import json
 import os
-from math import radians, sin, cos, sqrt, atan2
 import heapq
+import threading
+import numpy as np
+from app.utils.geo_index import GeoKDTree
+from app.services.road_graph import RoadGraph, haversine
+from app.services.graph_compiler import load_or_compile
+from app.services.contraction_hierarchy import ContractionHierarchy
+from app.services.shortest_path_tree import ShortestPathTree, EdgeChange
+from app.services.travel_profiles import TravelTimeProfiles
 
-Graph = Dict[str, Dict[str, float]]  # adjacency: node -> {neighbor: weight}
+# Search result on the compact graph: (distance_km, node indices along the path, settled nodes)
+SearchResult = Tuple[float, List[int], int]
+
+# Shortest-path algorithms selectable per request ("ch" needs a prepared contraction hierarchy)
+ALGORITHMS = ("dijkstra", "astar", "bidirectional", "ch")
+
+# Reported when a query is answered from a precomputed destination tree
+TREE_ALGORITHM = "tree"
+
+# Reported for departure-time queries over the travel-time profiles
+TIME_DEPENDENT_ALGORITHM = "time-dependent"
 
 @dataclass
 class Node:
@@ -14,108 +32,656 @@ class Node:
     lat: float
     lng: float
 
+@dataclass(frozen=True)
+class RoutingState:
+    """
+    Everything a query reads, replaced as a whole and never mutated.
+
+    Updates build a new state (copying only what changes) and swap it in
+    with one assignment, so in-flight requests finish on the state they
+    started with.
+    """
+    road: RoadGraph
+    node_index: GeoKDTree
+    fingerprint: str  # sha256 of campus_graph.json
+    base_weights: Sequence[float]  # weights as compiled, before live updates
+    weights_version: int = 0  # bumped by every live weight update
+    ch: ContractionHierarchy | None = None
+    trees: Dict[int, ShortestPathTree] = field(default_factory=dict)
+
+    @property
+    def weights_key(self) -> str:
+        """Identifies graph and weights; stamps precomputation built on this state"""
+        return f"{self.fingerprint}:{self.weights_version}"
+
 class RoutingService:
-    def __init__(self, data_dir: str, college_lat: float | None = None, college_lng: float | None = None):
-        self.nodes: Dict[str, Node] = {}
-        self.graph: Graph = {}
+    def __init__(self, data_dir: str, college_lat: float | None = None, college_lng: float | None = None,
+                 use_contraction_hierarchy: bool = False, default_algorithm: str = "dijkstra",
+                 destinations: List[Tuple[float, float]] | None = None):
+        if default_algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown routing algorithm '{default_algorithm}'")
+        self.default_algorithm = default_algorithm
+        self.state: RoutingState | None = None
+        # Serializes state swaps (requests only read self.state)
+        self._state_lock = threading.RLock()
+        # Background re-contraction after live weight updates (see update_edge_weights)
+        self._recontracting = False
+        # Whether queries should have a contraction hierarchy; reload_graph rebuilds it from this
+        self.use_contraction_hierarchy = use_contraction_hierarchy
+        self._contraction_order: Sequence[int] | None = None
         # Optional college coordinates (if provided, we compute nearest node to these)
         self.college_coords: Tuple[float, float] | None = None
         if college_lat is not None and college_lng is not None:
             self.college_coords = (college_lat, college_lng)
         self.college_id: str = "college"
-        self._load_graph(os.path.join(data_dir, 'campus_graph.json'))
+        self.graph_path = os.path.join(data_dir, 'campus_graph.json')
+        # Compiled binary graph, memory-mapped at startup (see graph_compiler)
+        self.binary_path = os.path.join(data_dir, 'campus_graph.bin')
+        # Contraction hierarchy is saved next to the graph it was built from
+        self.ch_path = os.path.join(data_dir, 'campus_graph.ch.npz')
+        # Extra fixed destinations (besides the college) that get a precomputed shortest-path tree
+        self.destinations: List[Tuple[float, float]] = list(destinations or [])
+        # Time-of-day speeds per road class for departure-time queries
+        self.profiles = TravelTimeProfiles.load(os.path.join(data_dir, 'travel_profiles.json'))
+        self._speed_tables: Dict[Tuple[str, ...], List[float]] = {}
+        self.state = self._load_graph(self.graph_path)
+        if use_contraction_hierarchy:
+            self.prepare_contraction_hierarchy()
+        self.prepare_destination_trees()
 
-    def _load_graph(self, path: str) -> None:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        # Load nodes
-        for n in data['nodes']:
-            node = Node(id=n['id'], lat=n['lat'], lng=n['lng'])
-            self.nodes[node.id] = node
-        # Build adjacency with weights (great-circle distance)
-        self.graph = {nid: {} for nid in self.nodes}
-        for e in data['edges']:
-            a, b = e['from'], e['to']
-            d = self.haversine_km(self.nodes[a], self.nodes[b])
-            self.graph[a][b] = d
-            self.graph[b][a] = d  # assume undirected for simplicity
+    def _load_graph(self, path: str) -> RoutingState:
+        # Compact CSR graph with great-circle edge weights (edges are undirected) and the
+        # spatial index for snapping coordinates to graph nodes, mapped from the compiled file
+        compiled = load_or_compile(path, self.binary_path)
+        return RoutingState(compiled.road, compiled.node_index, compiled.fingerprint, compiled.road.weights)
+
+    def reload_graph(self) -> None:
+        """Re-read the graph from disk and rebuild everything derived from it, then swap it in"""
+        with self._state_lock:
+            state = self._load_graph(self.graph_path)
+            # Not self.state.ch: it is briefly None while live weights are re-contracted
+            if self.use_contraction_hierarchy:
+                state = replace(state, ch=self._hierarchy(state))
+            self.state = replace(state, trees=self._trees(state))
+
+    # Read-only views of the current state
+    @property
+    def road(self) -> RoadGraph:
+        return self.state.road
+
+    @property
+    def node_index(self) -> GeoKDTree:
+        return self.state.node_index
+
+    @property
+    def ch(self) -> ContractionHierarchy | None:
+        return self.state.ch
+
+    @property
+    def trees(self) -> Dict[int, ShortestPathTree]:
+        return self.state.trees
+
+    @property
+    def graph_fingerprint(self) -> str:
+        return self.state.fingerprint
+
+    @property
+    def node_ids(self) -> List[str]:
+        return self.road.node_ids
+
+    def has_node(self, node_id: str) -> bool:
+        return node_id in self.road.index
+
+    def node(self, node_id: str) -> Node:
+        road = self.road
+        i = road.index[node_id]
+        return Node(id=node_id, lat=road.lat[i], lng=road.lng[i])
 
     @staticmethod
     def haversine_km(a: Node, b: Node) -> float:
-        R = 6371.0
-        lat1, lon1, lat2, lon2 = map(radians, [a.lat, a.lng, b.lat, b.lng])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        h = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-        c = 2 * atan2(sqrt(h), sqrt(1 - h))
-        return R * c
-
-    def _nearest_node(self, lat: float, lng: float) -> str:
-        tmp_node = Node(id="tmp", lat=lat, lng=lng)
-        best_id = None
-        best_d = float('inf')
-        for nid, node in self.nodes.items():
-            d = self.haversine_km(tmp_node, node)
-            if d < best_d:
-                best_d = d
-                best_id = nid
-        return best_id  # type: ignore
+        return haversine(a.lat, a.lng, b.lat, b.lng)
+
+    @staticmethod
+    def _nearest_node(state: RoutingState, lat: float, lng: float) -> str:
+        return state.road.node_ids[state.node_index.nearest(lat, lng)]
+
+    def nearest_nodes(self, lat: float, lng: float, k: int = 1) -> List[Tuple[str, float]]:
+        """Return the k graph nodes closest to (lat, lng) as (node_id, distance_km), nearest first"""
+        state = self.state
+        return [(state.road.node_ids[i], d) for d, i in state.node_index.query(lat, lng, k)]
+
+    def snap_to_nodes(self, coords: List[Tuple[float, float]], state: RoutingState | None = None) -> List[str]:
+        """Snap many (lat, lng) pairs to their nearest graph node in one call"""
+        if not coords:
+            return []
+        state = state or self.state
+        lats, lngs = zip(*coords)
+        return [state.road.node_ids[i] for i in state.node_index.nearest_many(lats, lngs)]
+
+    def prepare_contraction_hierarchy(self, rebuild: bool = False) -> ContractionHierarchy:
+        """Load the saved contraction hierarchy, or build and save it if missing or stale"""
+        with self._state_lock:
+            ch = self._hierarchy(self.state, rebuild)
+            self.state = replace(self.state, ch=ch)
+            self.use_contraction_hierarchy = True
+        return ch
+
+    def _hierarchy(self, state: RoutingState, rebuild: bool = False) -> ContractionHierarchy:
+        if state.weights_version:
+            # Live weights: not worth persisting, and the saved file must match campus_graph.json
+            return ContractionHierarchy.build(state.road, state.weights_key, self._contraction_order)
+        ch = None if rebuild else ContractionHierarchy.load(self.ch_path, state.fingerprint)
+        if ch is None:
+            ch = ContractionHierarchy.build(state.road, state.fingerprint)
+            ch.save(self.ch_path)
+        return ch
+
+    def _college_node(self, state: RoutingState) -> str | None:
+        if self.college_coords is not None:
+            return self._nearest_node(state, *self.college_coords)
+        return self.college_id if self.college_id in state.road.index else None
+
+    def prepare_destination_trees(self) -> Dict[int, ShortestPathTree]:
+        """
+        Build a shortest-path tree for the college and every configured destination.
+
+        Trees for nodes that are no longer destinations are dropped, and trees
+        built on another version of the graph are rebuilt.
+        """
+        with self._state_lock:
+            trees = self._trees(self.state)
+            self.state = replace(self.state, trees=trees)
+        return trees
+
+    def _trees(self, state: RoutingState) -> Dict[int, ShortestPathTree]:
+        road = state.road
+        if not road.node_count:
+            return {}
+        if self.college_coords is not None:
+            roots = [state.node_index.nearest(*self.college_coords)]
+        else:
+            roots = [road.index[self.college_id]] if self.college_id in road.index else []
+        roots += [state.node_index.nearest(lat, lng) for lat, lng in self.destinations]
+        trees: Dict[int, ShortestPathTree] = {}
+        for root in roots:
+            tree = state.trees.get(root)
+            if tree is None or tree.fingerprint != state.weights_key:
+                tree = ShortestPathTree.build(road, root, state.weights_key)
+            trees[root] = tree
+        return trees
+
+    def update_edge_weights(self, updates: List[Tuple[str, str, float]], reset: bool = False) -> dict:
+        """
+        Apply congestion to roads without reloading the graph.
+
+        Each update is (from_id, to_id, factor): the road between the two
+        nodes (both directions) costs factor times its great-circle length.
+        Factors below 1 are rejected so A*'s straight-line heuristic stays
+        exact; factor 1 restores a road, and reset=True restores all roads
+        first. Destination trees are repaired incrementally. The contraction
+        hierarchy cannot be patched, so it is dropped and re-contracted in
+        the background with its previous node order; queries fall back to
+        the other algorithms meanwhile.
+        """
+        with self._state_lock:
+            state = self.state
+            road, base = state.road, state.base_weights
+            # Copy-on-write: in-flight queries keep reading the old array
+            weights = array('d', base) if reset else array('d', road.weights)
+            for from_id, to_id, factor in updates:
+                if from_id not in road.index or to_id not in road.index:
+                    raise ValueError(f"Unknown node in edge update: {from_id} -> {to_id}")
+                if factor < 1:
+                    raise ValueError(f"Congestion factor must be at least 1, got {factor} for {from_id} -> {to_id}")
+                u, v = road.index[from_id], road.index[to_id]
+                e, back = road.edge_slot(u, v), road.edge_slot(v, u)
+                if e == -1:
+                    raise ValueError(f"No road between {from_id} and {to_id}")
+                weights[e] = weights[back] = base[e] * factor
+
+            old = np.frombuffer(road.weights, dtype=np.float64)
+            new = np.frombuffer(weights, dtype=np.float64)
+            slots = np.flatnonzero(old != new)
+            offsets = np.asarray(road.offsets, dtype=np.int64)
+            sources = np.searchsorted(offsets, slots, side='right') - 1
+            targets = np.asarray(road.targets, dtype=np.int64)[slots]
+            # One change per road (both directions share a weight)
+            changes: List[EdgeChange] = [(int(u), int(v), float(old[e]), float(new[e]))
+                                         for u, v, e in zip(sources, targets, slots) if u <= v]
+            summary = {"updated_roads": len(changes), "weights_version": state.weights_version,
+                       "repaired_trees": 0, "repaired_nodes": 0}
+            if not changes:
+                return summary
+
+            next_state = replace(state, road=road.with_weights(weights), weights_version=state.weights_version + 1,
+                                 ch=None, trees={})
+            trees: Dict[int, ShortestPathTree] = {}
+            for root, tree in state.trees.items():
+                trees[root], settled = tree.repaired(next_state.road, changes, next_state.weights_key)
+                summary["repaired_nodes"] += settled
+            self.state = replace(next_state, trees=trees)
+            summary["weights_version"] = next_state.weights_version
+            summary["repaired_trees"] = len(trees)
+            if state.ch is not None:
+                self._contraction_order = state.ch.rank
+            # Also when a previous re-contraction failed and left the state without a hierarchy
+            if self.use_contraction_hierarchy:
+                self._recontract_in_background()
+        return summary
+
+    def apply_congestion_feed(self, path: str) -> dict:
+        """
+        Apply a congestion feed file:
+        {"reset": bool, "updates": [{"from": id, "to": id, "factor": float}, ...]}
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            feed = json.load(f)
+        updates = [(u['from'], u['to'], float(u['factor'])) for u in feed.get('updates', [])]
+        return self.update_edge_weights(updates, reset=bool(feed.get('reset', False)))
+
+    def _recontract_in_background(self) -> None:
+        """Re-contract the current state on one worker thread, catching up with newer updates"""
+        with self._state_lock:
+            if self._recontracting:
+                return
+            self._recontracting = True
+
+        def run():
+            try:
+                while True:
+                    state = self.state
+                    ch = self._hierarchy(state) if state.ch is None else None
+                    with self._state_lock:
+                        # The flag is cleared under the same lock as the swap, so an update
+                        # landing right after it starts a new re-contraction
+                        if self.state.ch is not None:  # reload_graph rebuilt it meanwhile
+                            self._recontracting = False
+                            return
+                        if self.state.weights_key == state.weights_key:
+                            self.state = replace(self.state, ch=ch)
+                            self._recontracting = False
+                            return
+                    # Weights changed again while contracting: start over on the newer state
+            except Exception as e:
+                # Queries keep using the other algorithms; the next weight update tries again
+                print(f"Contraction hierarchy re-contraction failed: {e!r}")
+                with self._state_lock:
+                    self._recontracting = False
+        threading.Thread(target=run, name="ch-recontract", daemon=True).start()
+
+    def set_college(self, lat: float, lng: float) -> None:
+        """Move the college destination and rebuild its tree"""
+        self.college_coords = (lat, lng)
+        self.prepare_destination_trees()
+
+    def add_destination(self, lat: float, lng: float) -> None:
+        """Register another fixed destination and precompute its tree"""
+        self.destinations.append((lat, lng))
+        self.prepare_destination_trees()
+
+    def _tree_to(self, state: RoutingState, node_id: str) -> ShortestPathTree:
+        root = state.road.index[node_id]
+        tree = state.trees.get(root)
+        if tree is None or tree.fingerprint != state.weights_key:
+            tree = ShortestPathTree.build(state.road, root, state.weights_key)
+        return tree
+
+    def _route(self, state: RoutingState, start_id: str, end_id: str,
+               algorithm: str | None = None) -> Tuple[float, List[int], int, str]:
+        """
+        Shortest path between graph nodes of state with the selected algorithm.
+
+        Without an explicit algorithm, paths to a destination with a
+        precomputed tree just follow its parent pointers; otherwise the
+        contraction hierarchy is used when prepared, else self.default_algorithm.
+        Returns (distance_km, node indices, settled_nodes, algorithm).
+        """
+        s, t = state.road.index[start_id], state.road.index[end_id]
+        if algorithm is None:
+            tree = state.trees.get(t)
+            if tree is not None:
+                total_km, path = tree.path_from(s)
+                return total_km, path, 0, TREE_ALGORITHM
+            algorithm = "ch" if state.ch is not None else self.default_algorithm
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown routing algorithm '{algorithm}'. Choose one of: {', '.join(ALGORITHMS)}")
+        if algorithm == "ch":
+            if state.ch is None:
+                raise ValueError("Contraction hierarchy is not prepared on this server")
+            total_km, path, settled = state.ch.search_indices(s, t)
+        elif algorithm == "astar":
+            total_km, path, settled = self._astar(state.road, s, t)
+        elif algorithm == "bidirectional":
+            total_km, path, settled = self._bidirectional(state.road, s, t)
+        else:
+            total_km, path, settled = self._dijkstra(state.road, s, t)
+        return total_km, path, settled, algorithm
+
+    @staticmethod
+    def _ids(road: RoadGraph, path: List[int]) -> List[str]:
+        node_ids = road.node_ids
+        return [node_ids[i] for i in path]
 
     def dijkstra(self, start_id: str, end_id: str) -> Tuple[float, List[str]]:
-        dist = {nid: float('inf') for nid in self.graph}
-        prev: Dict[str, Optional[str]] = {nid: None for nid in self.graph}
-        dist[start_id] = 0.0
-        pq: List[Tuple[float, str]] = [(0.0, start_id)]
+        total_km, path_ids, _ = self.dijkstra_search(start_id, end_id)
+        return total_km, path_ids
+
+    def dijkstra_search(self, start_id: str, end_id: str) -> Tuple[float, List[str], int]:
+        """Unidirectional Dijkstra; returns (distance_km, path, settled_nodes)"""
+        road = self.road
+        total_km, path, settled = self._dijkstra(road, road.index[start_id], road.index[end_id])
+        return total_km, self._ids(road, path), settled
+
+    def astar_search(self, start_id: str, end_id: str) -> Tuple[float, List[str], int]:
+        road = self.road
+        total_km, path, settled = self._astar(road, road.index[start_id], road.index[end_id])
+        return total_km, self._ids(road, path), settled
+
+    def bidirectional_search(self, start_id: str, end_id: str) -> Tuple[float, List[str], int]:
+        road = self.road
+        total_km, path, settled = self._bidirectional(road, road.index[start_id], road.index[end_id])
+        return total_km, self._ids(road, path), settled
+
+    def _dijkstra(self, road: RoadGraph, s: int, t: int) -> SearchResult:
+        offsets, targets, weights = road.offsets, road.targets, road.weights
+        dist: Dict[int, float] = {s: 0.0}
+        prev: Dict[int, int] = {s: -1}
+        pq: List[Tuple[float, int]] = [(0.0, s)]
+        settled = 0
         while pq:
             d, u = heapq.heappop(pq)
             if d != dist[u]:
                 continue
-            if u == end_id:
+            settled += 1
+            if u == t:
+                return d, self._reconstruct(prev, t), settled
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    prev[v] = u
+                    heapq.heappush(pq, (nd, v))
+        return float('inf'), [], settled
+
+    def _astar(self, road: RoadGraph, s: int, t: int) -> SearchResult:
+        """
+        A* guided by great-circle distance to the target.
+
+        Edge weights are great-circle kilometres, so the heuristic never
+        overestimates the remaining distance and the result matches Dijkstra.
+        """
+        offsets, targets, weights, lat, lng = road.offsets, road.targets, road.weights, road.lat, road.lng
+        t_lat, t_lng = lat[t], lng[t]
+        heuristic: Dict[int, float] = {}
+        dist: Dict[int, float] = {s: 0.0}
+        prev: Dict[int, int] = {s: -1}
+        pq: List[Tuple[float, float, int]] = [(haversine(lat[s], lng[s], t_lat, t_lng), 0.0, s)]
+        settled = 0
+        while pq:
+            _, d, u = heapq.heappop(pq)
+            if d != dist[u]:
+                continue
+            settled += 1
+            if u == t:
+                return d, self._reconstruct(prev, t), settled
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    prev[v] = u
+                    h = heuristic.get(v)
+                    if h is None:
+                        h = heuristic[v] = haversine(lat[v], lng[v], t_lat, t_lng)
+                    heapq.heappush(pq, (nd + h, nd, v))
+        return float('inf'), [], settled
+
+    def _bidirectional(self, road: RoadGraph, s: int, t: int) -> SearchResult:
+        """Dijkstra from both ends at once (the graph is undirected), meeting in the middle"""
+        if s == t:
+            return 0.0, [s], 1
+        offsets, targets, weights = road.offsets, road.targets, road.weights
+        dist: Tuple[Dict[int, float], Dict[int, float]] = ({s: 0.0}, {t: 0.0})
+        prev: Tuple[Dict[int, int], Dict[int, int]] = ({s: -1}, {t: -1})
+        queues: Tuple[list, list] = ([(0.0, s)], [(0.0, t)])
+        best, meet = float('inf'), None
+        settled = 0
+        while queues[0] and queues[1]:
+            # Stop once no path through unsettled nodes can beat the best meeting point
+            if queues[0][0][0] + queues[1][0][0] >= best:
                 break
-            for v, w in self.graph[u].items():
-                nd = d + w
-                if nd < dist[v]:
+            side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+            d, u = heapq.heappop(queues[side])
+            if d != dist[side][u]:
+                continue
+            settled += 1
+            mine, other = dist[side], dist[side ^ 1]
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < mine.get(v, float('inf')):
+                    mine[v] = nd
+                    prev[side][v] = u
+                    heapq.heappush(queues[side], (nd, v))
+                if v in other and nd + other[v] < best:
+                    best, meet = nd + other[v], (u, v) if side == 0 else (v, u)
+        if meet is None:
+            return float('inf'), [], settled
+        # meet is an edge (a, b) with a reached forwards and b reached backwards
+        a, b = meet
+        path = self._reconstruct(prev[0], a)
+        cur = b
+        while cur != -1:
+            path.append(cur)
+            cur = prev[1][cur]
+        return best, path, settled
+
+    def time_dependent_search(self, start_id: str, end_id: str, depart_minute: float) -> Tuple[float, List[str], int]:
+        """Fastest path when leaving at depart_minute (minutes after midnight); returns (minutes, path, settled)"""
+        road = self.road
+        arrival, path, settled = self._time_dependent(road, road.index[start_id], road.index[end_id], depart_minute)
+        return arrival - depart_minute, self._ids(road, path), settled
+
+    def _time_dependent(self, road: RoadGraph, s: int, t: int, depart_minute: float) -> SearchResult:
+        """
+        A* on arrival time over the travel-time profiles.
+
+        Edge costs are FIFO (see travel_profiles), so settling nodes in
+        arrival order is exact. Straight-line distance at the fastest profile
+        speed never overestimates the remaining time, since edge weights are
+        at least the great-circle length. Returns (arrival minute, path, settled).
+        """
+        offsets, targets, weights, classes = road.offsets, road.targets, road.weights, road.edge_class
+        lat, lng = road.lat, road.lng
+        key = tuple(road.class_names)
+        table = self._speed_tables.get(key)
+        if table is None:
+            table = self._speed_tables[key] = self.profiles.table(road.class_names)
+        arrival = self.profiles.arrival
+        bucket_minutes, buckets = self.profiles.bucket_minutes, self.profiles.buckets
+        max_speed = max(table)
+        t_lat, t_lng = lat[t], lng[t]
+        heuristic: Dict[int, float] = {}
+        dist: Dict[int, float] = {s: depart_minute}
+        prev: Dict[int, int] = {s: -1}
+        pq: List[Tuple[float, float, int]] = [(depart_minute, depart_minute, s)]
+        settled = 0
+        while pq:
+            _, d, u = heapq.heappop(pq)
+            if d != dist[u]:
+                continue
+            settled += 1
+            if u == t:
+                return d, self._reconstruct(prev, t), settled
+            bucket = int(d // bucket_minutes)
+            bucket_end = (bucket + 1) * bucket_minutes
+            bucket %= buckets
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                # Fast path: the whole road is driven within the current bucket
+                nd = d + weights[e] / table[classes[e] * buckets + bucket]
+                if nd > bucket_end:
+                    nd = arrival(table, classes[e], weights[e], d)
+                if nd < dist.get(v, float('inf')):
                     dist[v] = nd
                     prev[v] = u
+                    h = heuristic.get(v)
+                    if h is None:
+                        h = heuristic[v] = haversine(lat[v], lng[v], t_lat, t_lng) / max_speed
+                    heapq.heappush(pq, (nd + h, nd, v))
+        return float('inf'), [], settled
+
+    @staticmethod
+    def _one_to_many(road: RoadGraph, s: int, targets: List[int]) -> List[float]:
+        """Dijkstra from s that stops once every target is settled; distances in targets order"""
+        offsets, targets_, weights = road.offsets, road.targets, road.weights
+        dist: Dict[int, float] = {s: 0.0}
+        remaining = set(targets)
+        pq: List[Tuple[float, int]] = [(0.0, s)]
+        while pq and remaining:
+            d, u = heapq.heappop(pq)
+            if d != dist[u]:
+                continue
+            remaining.discard(u)
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets_[e]
+                nd = d + weights[e]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
                     heapq.heappush(pq, (nd, v))
-        if dist[end_id] == float('inf'):
-            return float('inf'), []
-        # Reconstruct
-        path: List[str] = []
-        cur = end_id
-        while cur is not None:
+        return [dist.get(t, float('inf')) for t in targets]
+
+    def distance_matrix(self, origins: List[Tuple[float, float]],
+                        destinations: List[Tuple[float, float]]) -> Tuple[List[str], List[str], np.ndarray]:
+        """
+        Road distances in km from every origin to every destination.
+
+        Coordinates are snapped to graph nodes and repeated nodes are routed
+        once. Uses bucket many-to-many on the contraction hierarchy when
+        prepared, otherwise one Dijkstra per distinct origin that stops
+        after reaching all destinations. Returns (origin nodes, destination
+        nodes, len(origins) x len(destinations) float array, inf if unreachable).
+        """
+        state = self.state
+        origin_nodes = self.snap_to_nodes(origins, state)
+        destination_nodes = self.snap_to_nodes(destinations, state)
+        index = state.road.index
+        sources = list(dict.fromkeys(index[nid] for nid in origin_nodes))
+        targets = list(dict.fromkeys(index[nid] for nid in destination_nodes))
+        if state.ch is not None:
+            table = state.ch.many_to_many(sources, targets)
+        else:
+            table = np.array([self._one_to_many(state.road, s, targets) for s in sources], dtype=np.float64)
+            table = table.reshape(len(sources), len(targets))
+        rows = {s: i for i, s in enumerate(sources)}
+        cols = {t: j for j, t in enumerate(targets)}
+        matrix = table[np.ix_([rows[index[nid]] for nid in origin_nodes],
+                              [cols[index[nid]] for nid in destination_nodes])]
+        return origin_nodes, destination_nodes, matrix
+
+    def node_distances(self, pairs: List[Tuple[int, int]], state: RoutingState | None = None) -> np.ndarray:
+        """
+        Road distances in km for (source, target) node-index pairs, inf if unreachable.
+
+        Uses many-to-many over the distinct sources and targets on the contraction
+        hierarchy when prepared, otherwise one bounded Dijkstra per distinct source.
+        """
+        state = state or self.state
+        if state.ch is not None:
+            sources = list(dict.fromkeys(s for s, _ in pairs))
+            targets = list(dict.fromkeys(t for _, t in pairs))
+            table = state.ch.many_to_many(sources, targets)
+            rows = {s: i for i, s in enumerate(sources)}
+            cols = {t: j for j, t in enumerate(targets)}
+            return table[[rows[s] for s, _ in pairs], [cols[t] for _, t in pairs]]
+        by_source: Dict[int, List[int]] = {}
+        for s, t in pairs:
+            by_source.setdefault(s, []).append(t)
+        found: Dict[Tuple[int, int], float] = {}
+        for s, targets in by_source.items():
+            targets = list(dict.fromkeys(targets))
+            found.update(((s, t), d) for t, d in zip(targets, self._one_to_many(state.road, s, targets)))
+        return np.array([found[pair] for pair in pairs], dtype=np.float64)
+
+    @staticmethod
+    def _reconstruct(prev: Dict[int, int], end: int) -> List[int]:
+        path: List[int] = []
+        cur = end
+        while cur != -1:
             path.append(cur)
             cur = prev[cur]
         path.reverse()
-        return dist[end_id], path
+        return path
 
-    def shortest_path(self, start_lat: float, start_lng: float, dest_lat: float, dest_lng: float):
-        start_node = self._nearest_node(start_lat, start_lng)
-        end_node = self._nearest_node(dest_lat, dest_lng)
-        total_km, path_ids = self.dijkstra(start_node, end_node)
-        coords = [[self.nodes[nid].lat, self.nodes[nid].lng] for nid in path_ids]
-        return {
-            "start_node": start_node,
-            "end_node": end_node,
-            "distance_km": round(total_km, 3),
-            "nodes": path_ids,
-            "path": coords
-        }
+    def shortest_path(self, start_lat: float, start_lng: float, dest_lat: float, dest_lng: float,
+                      algorithm: str | None = None, depart_minute: float | None = None):
+        # One state for snapping, searching and the response, even if a swap lands mid-request
+        state = self.state
+        start_node = self._nearest_node(state, start_lat, start_lng)
+        end_node = self._nearest_node(state, dest_lat, dest_lng)
+        return self._path_response(state, start_node, end_node, algorithm, depart_minute)
 
-    def shortest_path_to_college(self, start_lat: float, start_lng: float):
+    def shortest_path_to_college(self, start_lat: float, start_lng: float, algorithm: str | None = None,
+                                 depart_minute: float | None = None):
         # If configured college coordinates are available, route to nearest node to that
         if self.college_coords is not None:
             dest_lat, dest_lng = self.college_coords
-            return self.shortest_path(start_lat, start_lng, dest_lat, dest_lng)
+            return self.shortest_path(start_lat, start_lng, dest_lat, dest_lng, algorithm, depart_minute)
         # Fallback to explicit 'college' node in graph
-        start_node = self._nearest_node(start_lat, start_lng)
-        end_node = self.college_id if self.college_id in self.nodes else start_node
-        total_km, path_ids = self.dijkstra(start_node, end_node)
-        coords = [[self.nodes[nid].lat, self.nodes[nid].lng] for nid in path_ids]
+        state = self.state
+        start_node = self._nearest_node(state, start_lat, start_lng)
+        end_node = self._college_node(state) or start_node
+        return self._path_response(state, start_node, end_node, algorithm, depart_minute)
+
+    def shortest_paths_to_college(self, coords: List[Tuple[float, float]]) -> Iterator[dict]:
+        """
+        Routes from many (lat, lng) starts to the college, yielded one by one.
+
+        All starts are snapped in one pass and every route is read off the
+        same destination tree, so a batch costs one tree plus O(path) per start.
+        """
+        # The stream may outlive a state swap, so it keeps reading this one
+        state = self.state
+        end_node = self._college_node(state)
+        if end_node is None:
+            raise ValueError("No college destination configured")
+        tree = self._tree_to(state, end_node)
+        starts = self.snap_to_nodes(coords, state)
+
+        def responses() -> Iterator[dict]:
+            for start_node in starts:
+                total_km, path = tree.path_from(state.road.index[start_node])
+                yield self._response(state.road, start_node, end_node, total_km, path, 0, TREE_ALGORITHM)
+        return responses()
+
+    def _path_response(self, state: RoutingState, start_node: str, end_node: str, algorithm: str | None,
+                       depart_minute: float | None = None):
+        road = state.road
+        if depart_minute is None:
+            total_km, path, settled, algorithm = self._route(state, start_node, end_node, algorithm)
+            return self._response(road, start_node, end_node, total_km, path, settled, algorithm)
+        if algorithm is not None:
+            raise ValueError("A departure time cannot be combined with an explicit algorithm")
+        arrival, path, settled = self._time_dependent(road, road.index[start_node], road.index[end_node],
+                                                      depart_minute)
+        total_km = sum(road.weights[road.edge_slot(a, b)] for a, b in zip(path, path[1:])) if path else float('inf')
+        res = self._response(road, start_node, end_node, total_km, path, settled, TIME_DEPENDENT_ALGORITHM)
+        res["duration_minutes"] = round(arrival - depart_minute, 1) if path else None
+        return res
+
+    @staticmethod
+    def _response(road: RoadGraph, start_node: str, end_node: str, total_km: float, path: List[int],
+                  settled: int, algorithm: str) -> dict:
+        path_ids = [road.node_ids[i] for i in path]
+        lat, lng = road.lat, road.lng
+        coords = [[lat[i], lng[i]] for i in path]
         return {
             "start_node": start_node,
             "end_node": end_node,
             "distance_km": round(total_km, 3),
             "nodes": path_ids,
-            "path": coords
+            "path": coords,
+            "algorithm": algorithm,
+            "settled_nodes": settled
         }
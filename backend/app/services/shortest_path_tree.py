@@ -0,0 +1,135 @@
+"""
+Shortest-path trees towards fixed destinations.
+
+One full Dijkstra from a destination node records, for every node, its
+distance to the destination and the next node on a shortest path towards
+it. The routing graph is undirected, so this tree answers "from anywhere to
+the destination" queries by following parent pointers: the cost of a query
+is proportional to the length of its path, not the size of the graph.
+
+After edge weights change, repaired() derives the new tree from the old one,
+re-settling only the nodes whose distance can have changed.
+"""
+
+from __future__ import annotations
+from array import array
+from typing import List, Tuple
+import heapq
+import numpy as np
+from app.services.road_graph import RoadGraph
+
+
+# Changed road: (u, v, old weight, new weight), applied in both directions
+EdgeChange = Tuple[int, int, float, float]
+
+
+class ShortestPathTree:
+    # repaired() rebuilds from scratch when a cut invalidates more than this share of the nodes
+    REPAIR_LIMIT = 0.25
+
+    def __init__(self, root: int, dist: array, parent: array, fingerprint: str = ""):
+        self.root = root
+        self.dist = dist  # km from each node to root, inf when unreachable
+        self.parent = parent  # next node towards root, -1 at the root and for unreachable nodes
+        self.fingerprint = fingerprint  # graph the tree was built on
+
+    @classmethod
+    def build(cls, road: RoadGraph, root: int, fingerprint: str = "") -> "ShortestPathTree":
+        """Single-source Dijkstra from root over the whole graph"""
+        offsets, targets, weights = road.offsets, road.targets, road.weights
+        dist = array('d', [float('inf')]) * road.node_count
+        parent = array('i', [-1]) * road.node_count
+        dist[root] = 0.0
+        pq: List[Tuple[float, int]] = [(0.0, root)]
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d > dist[u]:
+                continue
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(pq, (nd, v))
+        return cls(root, dist, parent, fingerprint)
+
+    def path_from(self, s: int) -> Tuple[float, List[int]]:
+        """(distance_km, node indices from s to root); (inf, []) if root is unreachable"""
+        total_km = self.dist[s]
+        if total_km == float('inf'):
+            return total_km, []
+        parent = self.parent
+        path = [s]
+        while path[-1] != self.root:
+            path.append(parent[path[-1]])
+        return total_km, path
+
+    def repaired(self, road: RoadGraph, changes: List[EdgeChange],
+                 fingerprint: str = "") -> Tuple["ShortestPathTree", int]:
+        """
+        Tree for road (the same graph with new weights) derived from this one.
+
+        Nodes hanging below a tree edge that got longer lose their labels and
+        are re-seeded from unaffected neighbours; roads that got shorter seed
+        their endpoints. A Dijkstra from those seeds then settles only the
+        region whose distances changed. Returns (new tree, nodes settled).
+        """
+        offsets, targets, weights = road.offsets, road.targets, road.weights
+        inf = float('inf')
+        # Copy-on-write: queries still walking this tree keep seeing consistent arrays
+        dist = array('d', self.dist)
+        parent = array('i', self.parent)
+
+        cut = [v if parent[v] == u else u for u, v, old, new in changes
+               if new > old and (parent[v] == u or parent[u] == v)]
+        affected = set()
+        if cut:
+            parents = np.frombuffer(parent, dtype=np.int32)
+            by_parent = np.argsort(parents, kind='stable')
+            first = np.searchsorted(parents[by_parent], np.arange(road.node_count + 1))
+            stack = cut
+            while stack:
+                x = stack.pop()
+                if x not in affected:
+                    affected.add(x)
+                    stack.extend(by_parent[first[x]:first[x + 1]].tolist())
+                if len(affected) > road.node_count * self.REPAIR_LIMIT:
+                    return ShortestPathTree.build(road, self.root, fingerprint), road.node_count
+            for x in affected:
+                dist[x] = inf
+                parent[x] = -1
+
+        pq: List[Tuple[float, int]] = []
+        for x in affected:
+            for e in range(offsets[x], offsets[x + 1]):
+                y = targets[e]
+                nd = dist[y] + weights[e]
+                if nd < dist[x]:
+                    dist[x] = nd
+                    parent[x] = y
+            if dist[x] < inf:
+                pq.append((dist[x], x))
+        for u, v, old, new in changes:
+            if new < old:
+                for a, b in ((u, v), (v, u)):
+                    if dist[a] + new < dist[b]:
+                        dist[b] = dist[a] + new
+                        parent[b] = a
+                        pq.append((dist[b], b))
+
+        heapq.heapify(pq)
+        settled = 0
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d > dist[u]:
+                continue
+            settled += 1
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(pq, (nd, v))
+        return ShortestPathTree(self.root, dist, parent, fingerprint), settled
@@ -0,0 +1,105 @@
+"""
+Time-of-day travel-time profiles per road class.
+
+A day is split into fixed buckets (15 minutes by default) and every road
+class has one small array of speeds, one per bucket. Edges only store a
+one-byte class (RoadGraph.edge_class), so profiles cost
+classes x buckets floats no matter how large the graph is.
+
+Travel time integrates the speed profile across bucket boundaries: a car
+that enters a road just before the rush slows down part way along it.
+This keeps edge costs FIFO (leaving later never means arriving earlier),
+which is what makes the time-dependent Dijkstra in RoutingService exact.
+
+Profiles come from travel_profiles.json next to the graph when present:
+    {"bucket_minutes": 15, "speeds_kmh": {"arterial": [..96 speeds..], ...}}
+Classes without a profile use the built-in defaults below.
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence
+import json
+import os
+
+from app.services.road_graph import DEFAULT_EDGE_CLASS
+
+MINUTES_PER_DAY = 24 * 60
+DEFAULT_BUCKET_MINUTES = 15
+
+# (free-flow km/h, rush-hour km/h) for classes without a configured profile
+DEFAULT_SPEEDS_KMH = {
+    "highway": (60.0, 25.0),
+    "arterial": (40.0, 15.0),
+    DEFAULT_EDGE_CLASS: (30.0, 14.0),
+    "residential": (25.0, 18.0),
+}
+
+# Rush hours in minutes since midnight, with half-way speeds half an hour either side
+RUSH_HOURS = ((8 * 60, 10 * 60), (17 * 60, 20 * 60))
+
+
+def default_profile(free_kmh: float, rush_kmh: float, bucket_minutes: int = DEFAULT_BUCKET_MINUTES) -> List[float]:
+    """Speeds per bucket: free flow, dropping to rush_kmh in the morning and evening peaks"""
+    shoulder = (free_kmh + rush_kmh) / 2
+    speeds = []
+    for b in range(MINUTES_PER_DAY // bucket_minutes):
+        minute = b * bucket_minutes
+        speed = free_kmh
+        for start, end in RUSH_HOURS:
+            if start <= minute < end:
+                speed = rush_kmh
+                break
+            if start - 30 <= minute < start or end <= minute < end + 30:
+                speed = shoulder
+        speeds.append(speed)
+    return speeds
+
+
+class TravelTimeProfiles:
+    def __init__(self, speeds_kmh: Dict[str, Sequence[float]], bucket_minutes: int = DEFAULT_BUCKET_MINUTES):
+        if MINUTES_PER_DAY % bucket_minutes:
+            raise ValueError("bucket_minutes must divide a day")
+        self.bucket_minutes = bucket_minutes
+        self.buckets = MINUTES_PER_DAY // bucket_minutes
+        for name, speeds in speeds_kmh.items():
+            if len(speeds) != self.buckets:
+                raise ValueError(f"Profile '{name}' has {len(speeds)} speeds, expected {self.buckets}")
+            if min(speeds) <= 0:
+                raise ValueError(f"Profile '{name}' has a non-positive speed")
+        self.speeds_kmh = {name: list(speeds) for name, speeds in speeds_kmh.items()}
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "TravelTimeProfiles":
+        """Profiles from a JSON file if it exists, otherwise the built-in defaults"""
+        speeds: Dict[str, Sequence[float]] = {}
+        bucket_minutes = DEFAULT_BUCKET_MINUTES
+        if path is not None and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            bucket_minutes = int(data.get('bucket_minutes', DEFAULT_BUCKET_MINUTES))
+            speeds = data.get('speeds_kmh', {})
+        profiles = {name: default_profile(free, rush, bucket_minutes) for name, (free, rush) in DEFAULT_SPEEDS_KMH.items()}
+        profiles.update(speeds)
+        return cls(profiles, bucket_minutes)
+
+    def table(self, class_names: List[str]) -> List[float]:
+        """
+        Flat speed table in km per minute for a graph's classes: entry
+        class_id * buckets + bucket. Unknown classes use the default profile.
+        """
+        fallback = self.speeds_kmh[DEFAULT_EDGE_CLASS]
+        return [kmh / 60.0 for name in class_names for kmh in self.speeds_kmh.get(name, fallback)]
+
+    def arrival(self, table: List[float], class_id: int, km: float, minute: float) -> float:
+        """Arrival minute after driving km on a road of class_id, entering it at minute"""
+        bucket_minutes, buckets = self.bucket_minutes, self.buckets
+        row = class_id * buckets
+        while True:
+            bucket = int(minute // bucket_minutes)
+            speed = table[row + bucket % buckets]
+            left = (bucket + 1) * bucket_minutes - minute  # minutes until the speed changes
+            reach = speed * left
+            if km <= reach:
+                return minute + km / speed
+            km -= reach
+            minute += left
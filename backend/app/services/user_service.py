@@ -1,7 +1,7 @@
 from datetime import datetime
 from app.config import get_db
 from app.models.user_model import User, UserRegistration
-from app.utils.auth import hash_password
+from app.utils.auth import hash_password_async
 from pymongo.errors import DuplicateKeyError
 
 class UserService:
@@ -22,7 +22,7 @@ class UserService:
         try:
             await self.initialize()
             # Hash the password
-            password_hash = hash_password(user_data.password)
+            password_hash = await hash_password_async(user_data.password)
             
             # Create user document
             user_doc = {
@@ -79,6 +79,11 @@ class UserService:
             print(f"Error getting user by email: {e}")
             return None
     
+    async def update_password_hash(self, user_id, password_hash: str) -> None:
+        """Replace a user's stored password hash (e.g. after a cost factor change)"""
+        await self.initialize()
+        await self.users_collection.update_one({"_id": user_id}, {"$set": {"password_hash": password_hash}})
+    
     async def get_user_by_id(self, user_id: str):
         """Get user by ID"""
         try:
@@ -1,12 +1,30 @@
 from passlib.context import CryptContext
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import threading
+import time
 import jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from app.config import get_settings
 
-# Password hashing configuration
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+settings = get_settings()
+
+# Password hashing configuration. Min and max rounds are pinned to the configured cost,
+# so hashes made with any other cost count as needing an update
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                           bcrypt__rounds=settings.BCRYPT_ROUNDS,
+                           bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+                           bcrypt__max_rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt takes hundreds of milliseconds and releases the GIL: run it here, never on the
+# event loop. The pool size bounds how many hashes run at once
+_password_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                    thread_name_prefix="password-hash")
 
 # JWT Configuration
 SECRET_KEY = "your-secret-key-change-this-in-production"
@@ -23,6 +41,74 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    """hash_password in the password thread pool"""
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, hash_password, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password in the password thread pool. Returns (valid, new hash),
+    where new hash is set when the password is valid but its stored hash uses
+    an outdated cost factor and should be replaced.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _password_pool, pwd_context.verify_and_update, plain_password, hashed_password)
+
+class TokenCache:
+    """
+    Bounded LRU of verified JWT payloads keyed by the token's SHA-256 digest.
+    Entries are dropped at the token's exp, so a cached token is never
+    accepted after PyJWT itself would have rejected it as expired. Payloads
+    are copied in and out, so a caller editing its dict cannot change what
+    later requests see.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()  # sync dependencies run in the threadpool
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry[1])
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, payload: dict) -> None:
+        expires = payload.get("exp")
+        if not isinstance(expires, (int, float)) or self.max_size <= 0:
+            return  # tokens without an expiry are always verified
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            self._entries[key] = (float(expires), dict(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses}
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
+def decode_token(token: str) -> dict:
+    """Verified payload of a JWT, from the cache when this token was verified before; raises jwt.PyJWTError"""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.put(token, payload)
+    return payload
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -38,8 +124,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def verify_token(token: str) -> Optional[dict]:
     """Verify JWT token and return payload"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return decode_token(token)
     except jwt.PyJWTError:
         return None
 
@@ -58,10 +143,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        return {"id": user_id}
-    except jwt.JWTError:
+        payload = decode_token(token)
+    except jwt.PyJWTError:
         raise credentials_exception
+    user_id: str = payload.get("sub")
+    if user_id is None:
+        raise credentials_exception
+    return {"id": user_id}
+
+async def get_current_operator(current_user: dict = Depends(get_current_user)):
+    """The current user, if listed in OPERATOR_USER_IDS; 403 otherwise"""
+    if current_user["id"] not in settings.operator_user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Operator access required",
+        )
+    return current_user
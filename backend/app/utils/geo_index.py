@@ -0,0 +1,144 @@
+"""
+KD-tree over lat/lng points for nearest-neighbour lookups.
+
+Points are mapped to unit vectors on the sphere, where straight-line (chord)
+distance grows monotonically with great-circle distance, so the nearest
+point in 3D is also the nearest point by haversine. Queries are O(log n)
+on average; ties resolve to the lowest point index, like a linear scan.
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Sequence, Tuple
+from math import radians, sin, cos, asin, sqrt
+import heapq
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def unit_vectors(lats: Sequence[float] | np.ndarray, lngs: Sequence[float] | np.ndarray) -> np.ndarray:
+    """(n, 3) array of unit vectors for degree coordinates"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)], axis=1)
+
+
+def chord_to_km(chord_squared: float) -> float:
+    """Great-circle distance in km for a squared chord length on the unit sphere"""
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(chord_squared) / 2))
+
+
+class GeoKDTree:
+    """Static KD-tree over lat/lng points, built once and queried many times"""
+
+    LEAF_SIZE = 16
+
+    # Array name -> typecode, used to persist a built tree (see graph_compiler)
+    ARRAYS = {"dim": "i", "split": "d", "left": "i", "right": "i", "start": "i", "end": "i",
+              "index": "i", "x": "d", "y": "d", "z": "d"}
+
+    def __init__(self, lats: Sequence[float] | np.ndarray, lngs: Sequence[float] | np.ndarray):
+        points = unit_vectors(lats, lngs)
+        self.size = len(points)
+
+        # Node arrays; a node is a leaf when left == -1 and then covers [start, end)
+        self._dim: List[int] = []
+        self._split: List[float] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._start: List[int] = []
+        self._end: List[int] = []
+
+        order = np.arange(self.size)
+        if self.size:
+            self._build(points, order, 0, self.size)
+
+        # Points stored in leaf order as plain lists: element access is much cheaper than on ndarrays
+        self._index: Sequence[int] = order.tolist()
+        self._x: Sequence[float] = points[order, 0].tolist()
+        self._y: Sequence[float] = points[order, 1].tolist()
+        self._z: Sequence[float] = points[order, 2].tolist()
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {name: np.asarray(getattr(self, "_" + name), dtype=np.dtype(code)) for name, code in self.ARRAYS.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, Sequence]) -> "GeoKDTree":
+        """Rebuild a tree from to_arrays() output (lists, arrays or memoryviews)"""
+        tree = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(tree, "_" + name, arrays[name])
+        tree.size = len(arrays["index"])
+        return tree
+
+    def _new_node(self) -> int:
+        for column in (self._dim, self._split, self._left, self._right, self._start, self._end):
+            column.append(-1)
+        return len(self._dim) - 1
+
+    def _build(self, points: np.ndarray, order: np.ndarray, start: int, end: int) -> int:
+        node = self._new_node()
+        self._start[node], self._end[node] = start, end
+        if end - start <= self.LEAF_SIZE:
+            return node
+        chunk = points[order[start:end]]
+        dim = int(np.argmax(chunk.max(axis=0) - chunk.min(axis=0)))
+        mid = (end - start) // 2
+        part = np.argpartition(chunk[:, dim], mid)
+        order[start:end] = order[start:end][part]
+        self._dim[node] = dim
+        self._split[node] = float(points[order[start + mid], dim])
+        left = self._build(points, order, start, start + mid)
+        right = self._build(points, order, start + mid, end)
+        self._left[node], self._right[node] = left, right
+        return node
+
+    def query(self, lat: float, lng: float, k: int = 1) -> List[Tuple[float, int]]:
+        """Return up to k (distance_km, point_index) pairs, nearest first"""
+        if self.size == 0 or k <= 0:
+            return []
+        la, ln = radians(lat), radians(lng)
+        q = (cos(la) * cos(ln), cos(la) * sin(ln), sin(la))
+        qx, qy, qz = q
+        xs, ys, zs, index = self._x, self._y, self._z, self._index
+        dims, splits, lefts, rights = self._dim, self._split, self._left, self._right
+        starts, ends = self._start, self._end
+
+        best: List[Tuple[float, int]] = []  # max-heap of (-d2, -index)
+        worst = float('inf')
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound > worst:
+                continue
+            left = lefts[node]
+            if left == -1:
+                for p in range(starts[node], ends[node]):
+                    dx, dy, dz = xs[p] - qx, ys[p] - qy, zs[p] - qz
+                    d2 = dx * dx + dy * dy + dz * dz
+                    if d2 > worst:
+                        continue
+                    entry = (-d2, -index[p])
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+                    else:
+                        continue
+                    if len(best) == k:
+                        worst = -best[0][0]
+                continue
+            diff = q[dims[node]] - splits[node]
+            near, far = (left, rights[node]) if diff < 0 else (rights[node], left)
+            stack.append((far, diff * diff))
+            stack.append((near, bound))
+
+        return [(chord_to_km(-d2), -i) for d2, i in sorted(best, reverse=True)]
+
+    def nearest(self, lat: float, lng: float) -> int:
+        """Index of the point nearest to (lat, lng)"""
+        return self.query(lat, lng, 1)[0][1]
+
+    def nearest_many(self, lats: Sequence[float], lngs: Sequence[float]) -> List[int]:
+        """Nearest point index for each (lat, lng) pair"""
+        return [self.query(lat, lng, 1)[0][1] for lat, lng in zip(lats, lngs)]
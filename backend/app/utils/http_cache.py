@@ -0,0 +1,103 @@
+"""
+Pre-built HTTP payloads with ETag validation.
+
+Endpoints whose output rarely changes build a CachedBody once and serve it
+as-is: the ETag is a content hash computed at build time, and a request
+whose If-None-Match matches gets an empty 304 instead of the body. JSON
+bodies are also gzipped once up front for clients that accept it.
+PayloadCache keeps one CachedBody per source and rebuilds it only when the
+source's version changes.
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+import gzip
+import hashlib
+import json
+from fastapi import Request, Response
+
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 512
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    body: bytes
+    media_type: str
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)  # extra headers sent with the body
+    gzip_body: Optional[bytes] = None  # pre-compressed body, when smaller
+
+    @property
+    def gzip_etag(self) -> str:
+        # The gzip encoding is a different representation, so it gets its own tag
+        return self.etag[:-1] + '-gzip"'
+
+    @classmethod
+    def build(cls, body: bytes, media_type: str, headers: Optional[Dict[str, str]] = None,
+              compress: bool = False) -> "CachedBody":
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        gzip_body = None
+        if compress and len(body) >= GZIP_MIN_SIZE:
+            gzip_body = gzip.compress(body, mtime=0)
+            if len(gzip_body) >= len(body):
+                gzip_body = None
+        return cls(body, media_type, etag, dict(headers or {}), gzip_body)
+
+    @classmethod
+    def json(cls, content: Any, headers: Optional[Dict[str, str]] = None) -> "CachedBody":
+        """Encode content the way JSONResponse does, plus a gzipped copy"""
+        body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        return cls.build(body, "application/json", headers, compress=True)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match semantics: any listed tag (weak or strong) or '*' matches"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for coding in (accept_encoding or "").split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def cached_response(request: Request, payload: CachedBody, max_age: int) -> Response:
+    """Serve payload (gzipped when the client accepts it), or 304 Not Modified when the client already has this version"""
+    body, etag = payload.body, payload.etag
+    headers = {"Cache-Control": f"public, max-age={max_age}"}
+    if payload.gzip_body is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_gzip(request.headers.get("accept-encoding")):
+            body, etag = payload.gzip_body, payload.gzip_etag
+            headers["Content-Encoding"] = "gzip"
+    headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, payload.etag) or (payload.gzip_body is not None
+                                                     and etag_matches(if_none_match, payload.gzip_etag)):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    headers.update(payload.headers)
+    return Response(content=body, media_type=payload.media_type, headers=headers)
+
+
+class PayloadCache:
+    """One CachedBody per key, rebuilt only when the version passed in changes"""
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[Hashable, CachedBody]] = {}
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], CachedBody]) -> CachedBody:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            entry = self._entries[key] = (version, build())
+        return entry[1]
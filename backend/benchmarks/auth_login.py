@@ -0,0 +1,75 @@
+"""
+Benchmark: password verification on the event loop vs in the password pool.
+
+Fires a burst of concurrent logins (bcrypt verification only, no database)
+while a heartbeat task stands in for other requests on the same worker, and
+reports login throughput and the longest the heartbeat was kept waiting.
+Inline verification serialises every login and stalls the loop for the
+whole burst; the pool runs up to PASSWORD_HASH_WORKERS hashes in parallel
+and the loop stays responsive.
+
+Usage (from backend/):
+    python -m benchmarks.auth_login --logins 32 --rounds 12 --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+HEARTBEAT_SECONDS = 0.005
+
+
+async def heartbeat(stop: asyncio.Event) -> float:
+    """Longest delay past its 5 ms sleep, i.e. how long another request would have waited"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        worst = max(worst, time.perf_counter() - started - HEARTBEAT_SECONDS)
+    return worst
+
+
+async def burst(login, logins: int) -> tuple:
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return elapsed, await beat, results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32, help="concurrent logins in the burst")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--workers", type=int, default=4, help="password pool threads")
+    args = parser.parse_args()
+
+    # Read by app.config when app.utils.auth is first imported
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    from app.utils.auth import hash_password, verify_password, verify_and_update_password
+
+    stored = hash_password("correct horse battery staple")
+
+    async def inline_login():
+        # What the login handler used to do: bcrypt directly in the coroutine
+        return verify_password("correct horse battery staple", stored)
+
+    async def pooled_login():
+        valid, _ = await verify_and_update_password("correct horse battery staple", stored)
+        return valid
+
+    print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds}, {args.workers} pool threads")
+    for name, login in (("inline (event loop)", inline_login), ("password pool", pooled_login)):
+        elapsed, stall, results = asyncio.run(burst(login, args.logins))
+        assert all(results)
+        print(f"{name:22s} {args.logins / elapsed:7.1f} logins/s  {elapsed * 1000:7.0f} ms total  "
+              f"other requests waited up to {stall * 1000:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: scalar vs vectorized vs prepared-route Geometric Corridor Matching.
+
+Builds a random Pune-area route and hostelite set, checks that every mode
+returns the same matches, and reports the speedup.
+
+With --registered N, also registers N students spread over the metro area in
+a HosteliteGridIndex and compares an indexed query with a full scan.
+
+Usage (from backend/):
+    python -m benchmarks.corridor_matching --hostelites 5000 --segments 2000
+    python -m benchmarks.corridor_matching --registered 100000
+"""
+
+import argparse
+import random
+import time
+
+from app.services.corridor_matching_service import GeometricCorridorMatcher, HosteliteGridIndex, Point, Hostelite
+
+
+def make_route(segments: int, rng: random.Random) -> list[Point]:
+    """Random walk heading roughly south towards the college"""
+    lat, lng = 18.56, 73.80
+    route = [Point(lat, lng)]
+    for _ in range(segments):
+        lat += rng.uniform(-0.0006, 0.0002)
+        lng += rng.uniform(-0.0003, 0.0005)
+        route.append(Point(lat, lng))
+    return route
+
+
+def make_hostelites(count: int, route: list[Point], destination: Point, rng: random.Random) -> list[Hostelite]:
+    lats = [p.lat for p in route]
+    lngs = [p.lng for p in route]
+    hostelites = []
+    for i in range(count):
+        dest = destination if rng.random() < 0.9 else Point(destination.lat + 0.05, destination.lng)
+        hostelites.append(Hostelite(
+            id=f"h{i:05d}",
+            name=f"Hostelite {i}",
+            lat=rng.uniform(min(lats) - 0.02, max(lats) + 0.02),
+            lng=rng.uniform(min(lngs) - 0.02, max(lngs) + 0.02),
+            destination=dest,
+            phone="+91-0000000000"
+        ))
+    return hostelites
+
+
+def assert_equivalent(expected, actual, tolerance_m: float = 1e-6) -> None:
+    assert len(expected) == len(actual), f"match count differs: {len(expected)} != {len(actual)}"
+    for e, a in zip(expected, actual):
+        assert e.hostelite.id == a.hostelite.id, (e.hostelite.id, a.hostelite.id)
+        assert e.route_index == a.route_index and e.pickup_order == a.pickup_order
+        assert abs(e.distance_from_route - a.distance_from_route) <= tolerance_m
+        assert abs(e.pickup_point.lat - a.pickup_point.lat) <= 1e-12
+        assert abs(e.pickup_point.lng - a.pickup_point.lng) <= 1e-12
+        assert e.estimated_pickup_time_minutes == a.estimated_pickup_time_minutes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hostelites", type=int, default=5000)
+    parser.add_argument("--segments", type=int, default=2000)
+    parser.add_argument("--corridor", type=float, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--registered", type=int, default=0,
+                        help="students registered across the metro area for the grid index comparison")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    route = make_route(args.segments, rng)
+    destination = route[-1]
+    hostelites = make_hostelites(args.hostelites, route, destination, rng)
+
+    scalar = GeometricCorridorMatcher(corridor_width_meters=args.corridor)
+    vectorized = GeometricCorridorMatcher(corridor_width_meters=args.corridor, vectorized=True)
+
+    started = time.perf_counter()
+    expected = scalar.find_corridor_matches(route, hostelites, destination)
+    scalar_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = vectorized.find_corridor_matches(route, hostelites, destination)
+    vector_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    prepared_route = vectorized.prepare_route(route)
+    prepare_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    prepared = vectorized.find_corridor_matches(prepared_route, hostelites, destination)
+    prepared_s = time.perf_counter() - started
+
+    assert_equivalent(expected, actual)
+    assert_equivalent(expected, prepared)
+    print(f"{args.hostelites} hostelites x {args.segments} segments -> {len(actual)} matches (equivalent)")
+    print(f"scalar:     {scalar_s * 1000:9.1f} ms")
+    print(f"vectorized: {vector_s * 1000:9.1f} ms  ({scalar_s / vector_s:.0f}x faster)")
+    print(f"prepared:   {prepared_s * 1000:9.1f} ms  ({scalar_s / prepared_s:.0f}x faster, "
+          f"index built once in {prepare_s * 1000:.1f} ms)")
+
+    if args.registered:
+        compare_grid_index(args, rng, vectorized, prepared_route, destination)
+
+
+def compare_grid_index(args, rng: random.Random, matcher: GeometricCorridorMatcher, prepared_route, destination: Point) -> None:
+    students = [
+        Hostelite(id=f"s{i:06d}", name=f"Student {i}", lat=rng.uniform(18.30, 18.75),
+                  lng=rng.uniform(73.65, 74.10), destination=destination, phone="+91-0000000000")
+        for i in range(args.registered)
+    ]
+    index = HosteliteGridIndex()
+    started = time.perf_counter()
+    for student in students:
+        index.upsert(student)
+    insert_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    expected = matcher.find_corridor_matches(prepared_route, students, destination)
+    scan_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = matcher.find_indexed_matches(prepared_route, index, destination)
+    indexed_s = time.perf_counter() - started
+
+    assert_equivalent(expected, actual)
+    print(f"{args.registered} registered students -> {len(actual)} matches (equivalent)")
+    print(f"full scan:  {scan_s * 1000:9.1f} ms")
+    print(f"grid index: {indexed_s * 1000:9.1f} ms  ({scan_s / indexed_s:.0f}x faster, "
+          f"{insert_s / args.registered * 1e6:.1f} us per insert)")
+
+
+if __name__ == "__main__":
+    main()
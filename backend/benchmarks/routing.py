@@ -0,0 +1,143 @@
+"""
+Benchmark: shortest-path query strategies in RoutingService.
+
+Runs random queries against a graph directory (or a generated grid city),
+checks every strategy returns the same distance as plain Dijkstra and
+reports the mean query time.
+
+Usage (from backend/):
+    python -m benchmarks.routing --grid 150 --queries 200
+    python -m benchmarks.routing --data-dir app/data
+    python -m benchmarks.routing --matrix 500
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from app.services.routing_service import RoutingService
+
+
+def write_grid_graph(data_dir: str, size: int, rng: random.Random) -> None:
+    """Jittered size x size street grid around Pune with a few missing blocks and diagonals;
+    every tenth street is an arterial road, the rest are residential"""
+    nodes, edges = [], []
+    for i in range(size):
+        for j in range(size):
+            nodes.append({"id": f"n{i}_{j}",
+                          "lat": 18.40 + i * 0.002 + rng.uniform(-0.0005, 0.0005),
+                          "lng": 73.75 + j * 0.002 + rng.uniform(-0.0005, 0.0005)})
+    for i in range(size):
+        for j in range(size):
+            if i + 1 < size and rng.random() > 0.1:
+                edges.append({"from": f"n{i}_{j}", "to": f"n{i + 1}_{j}",
+                              "class": "arterial" if j % 10 == 0 else "residential"})
+            if j + 1 < size and rng.random() > 0.1:
+                edges.append({"from": f"n{i}_{j}", "to": f"n{i}_{j + 1}",
+                              "class": "arterial" if i % 10 == 0 else "residential"})
+            if i + 1 < size and j + 1 < size and rng.random() < 0.05:
+                edges.append({"from": f"n{i}_{j}", "to": f"n{i + 1}_{j + 1}", "class": "residential"})
+    with open(os.path.join(data_dir, 'campus_graph.json'), 'w', encoding='utf-8') as f:
+        json.dump({"nodes": nodes, "edges": edges}, f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", help="directory containing campus_graph.json (default: generated grid)")
+    parser.add_argument("--grid", type=int, default=100, help="side length of the generated grid city")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--matrix", type=int, default=0, help="also time an N x N distance matrix")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = tmp
+            write_grid_graph(data_dir, args.grid, rng)
+
+        service = RoutingService(data_dir)
+        road = service.road
+        print(f"graph: {road.node_count} nodes, {road.edge_count // 2} edges, "
+              f"{road.nbytes() / road.edge_count:.1f} bytes per directed edge")
+
+        started = time.perf_counter()
+        ch = service.prepare_contraction_hierarchy()
+        print(f"contraction hierarchy ready in {time.perf_counter() - started:.1f} s ({ch.shortcut_count} shortcuts)")
+
+        ids = service.node_ids
+        pairs = [(rng.choice(ids), rng.choice(ids)) for _ in range(args.queries)]
+        strategies = {
+            "dijkstra": service.dijkstra_search,
+            "astar": service.astar_search,
+            "bidirectional": service.bidirectional_search,
+            "contraction hierarchy": ch.search,
+        }
+        timings = {}
+        results = {}
+        settled = {}
+        for name, run in strategies.items():
+            started = time.perf_counter()
+            answers = [run(a, b) for a, b in pairs]
+            timings[name] = (time.perf_counter() - started) / len(pairs)
+            results[name] = [answer[0] for answer in answers]
+            settled[name] = sum(answer[2] for answer in answers) / len(pairs)
+
+        for name, distances in results.items():
+            for expected, actual in zip(results["dijkstra"], distances):
+                assert expected == actual or abs(expected - actual) < 1e-9, (name, expected, actual)
+
+        baseline = timings["dijkstra"]
+        for name, seconds in timings.items():
+            print(f"{name:24s} {seconds * 1000:8.3f} ms/query  ({baseline / seconds:5.1f}x)  "
+                  f"{settled[name]:9.0f} settled/query")
+
+        # Fixed destination (the "to college" case): precomputed tree vs a fresh Dijkstra per query
+        destination = rng.choice(ids)
+        started = time.perf_counter()
+        node = service.node(destination)
+        service.add_destination(node.lat, node.lng)
+        print(f"\nfixed destination, tree ready in {(time.perf_counter() - started) * 1000:.1f} ms")
+        sources = [a for a, _ in pairs]
+        fixed = {}
+        for name, algorithm in (("dijkstra", "dijkstra"), ("destination tree", None)):
+            started = time.perf_counter()
+            answers = [service._route(service.state, a, destination, algorithm) for a in sources]
+            fixed[name] = (time.perf_counter() - started) / len(sources), [answer[0] for answer in answers]
+        for expected, actual in zip(fixed["dijkstra"][1], fixed["destination tree"][1]):
+            assert expected == actual or abs(expected - actual) < 1e-9, ("destination tree", expected, actual)
+        baseline = fixed["dijkstra"][0]
+        for name, (seconds, _) in fixed.items():
+            print(f"{name:24s} {seconds * 1000:8.3f} ms/query  ({baseline / seconds:5.1f}x)")
+
+        # Departure-time queries over the rush-hour profiles vs static distance queries
+        print()
+        baseline = timings["dijkstra"]
+        for label, minute in (("time-dependent 03:00", 3 * 60), ("time-dependent 08:45", 8 * 60 + 45)):
+            started = time.perf_counter()
+            answers = [service.time_dependent_search(a, b, minute) for a, b in pairs]
+            seconds = (time.perf_counter() - started) / len(pairs)
+            mean_minutes = sum(a[0] for a in answers if a[1]) / max(1, sum(1 for a in answers if a[1]))
+            print(f"{label:24s} {seconds * 1000:8.3f} ms/query  ({baseline / seconds:5.1f}x)  "
+                  f"{sum(a[2] for a in answers) / len(pairs):9.0f} settled/query  {mean_minutes:6.1f} min/trip")
+
+        if args.matrix:
+            lats, lngs = list(road.lat), list(road.lng)
+            points = [[(rng.uniform(min(lats), max(lats)), rng.uniform(min(lngs), max(lngs)))
+                       for _ in range(args.matrix)] for _ in range(2)]
+            started = time.perf_counter()
+            origins, destinations, matrix = service.distance_matrix(*points)
+            elapsed = time.perf_counter() - started
+            print(f"\n{args.matrix}x{args.matrix} matrix via contraction hierarchy: {elapsed * 1000:.0f} ms")
+            for _ in range(20):
+                i, j = rng.randrange(args.matrix), rng.randrange(args.matrix)
+                expected = service.dijkstra_search(origins[i], destinations[j])[0]
+                assert expected == matrix[i, j] or abs(expected - matrix[i, j]) < 1e-9, (i, j, expected, matrix[i, j])
+
+
+if __name__ == "__main__":
+    main()
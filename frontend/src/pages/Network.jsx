@@ -81,13 +81,13 @@ const Network = () => {
         <div className="network-visualization">
           <div className="graph-container">
             <img 
-              src={`${API_BASE_URL}/rider/network`}
+              src={`${API_BASE_URL}/rider/network?format=svg`}
               alt="Pune Area Network Graph"
               className="network-graph"
               onError={(e) => {
                 // Try fallback on error
-                if (e.target.src === `${API_BASE_URL}/rider/network`) {
-                  e.target.src = `${API_FALLBACK_URL}/rider/network`;
+                if (e.target.src === `${API_BASE_URL}/rider/network?format=svg`) {
+                  e.target.src = `${API_FALLBACK_URL}/rider/network?format=svg`;
                 } else {
                   e.target.style.display = 'none';
                   setError('Failed to load network graph');